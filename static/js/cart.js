@@ -0,0 +1,101 @@
+// Cart changes go through /api/cart/ and update the page in place. The links
+// and forms still work as before without JavaScript, and are used as the
+// fallback when a request fails (e.g. not logged in).
+(function () {
+    var script = document.querySelector('script[data-cart-api]');
+    if (!script || !window.fetch) {
+        return;
+    }
+    var apiUrl = script.dataset.cartApi;
+
+    function csrfToken() {
+        var match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : null;
+    }
+
+    function send(operations) {
+        var token = csrfToken();
+        if (!token) {
+            return Promise.reject(new Error('No CSRF token'));
+        }
+        return fetch(apiUrl, {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': token},
+            body: JSON.stringify({ops: operations})
+        }).then(function (response) {
+            if (!response.ok) {
+                throw new Error('Cart request failed: ' + response.status);
+            }
+            return response.json();
+        }).then(function (cart) {
+            var badge = document.querySelector('[data-cart-count]');
+            if (badge) {
+                badge.textContent = cart.count || '';
+            }
+            return cart;
+        });
+    }
+
+    function money(value) {
+        return Number(value).toFixed(2);
+    }
+
+    function renderCart(cart) {
+        var table = document.querySelector('[data-cart-table]');
+        if (!cart.lines.length) {
+            // Let the server render the empty cart message.
+            window.location.reload();
+            return;
+        }
+        var lines = {};
+        cart.lines.forEach(function (line) {
+            lines[line.watch_id] = line;
+        });
+        table.querySelectorAll('tr[data-watch-id]').forEach(function (row) {
+            var line = lines[row.dataset.watchId];
+            if (!line) {
+                row.remove();
+                return;
+            }
+            row.querySelector('[data-field="quantity"]').textContent = line.quantity;
+            row.querySelector('[data-field="total"]').textContent = '$' + money(line.total);
+        });
+        document.querySelector('[data-cart-total]').textContent = money(cart.total);
+    }
+
+    document.addEventListener('click', function (event) {
+        var link = event.target.closest('[data-cart-add]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        send([{op: 'add', watch_id: parseInt(link.dataset.cartAdd, 10)}]).then(function () {
+            var label = link.textContent;
+            link.textContent = 'Added to cart';
+            setTimeout(function () {
+                link.textContent = label;
+            }, 1500);
+        }).catch(function () {
+            window.location = link.href;
+        });
+    });
+
+    document.addEventListener('submit', function (event) {
+        var form = event.target.closest('[data-cart-op]');
+        if (!form) {
+            return;
+        }
+        event.preventDefault();
+        var row = form.closest('tr[data-watch-id]');
+        var watchId = parseInt(row.dataset.watchId, 10);
+        var quantity = parseInt(row.querySelector('[data-field="quantity"]').textContent, 10);
+        var operation = {op: 'remove', watch_id: watchId};
+        if (form.dataset.cartOp !== 'remove') {
+            operation = {op: 'set', watch_id: watchId, quantity: quantity + (form.dataset.cartOp === 'increase' ? 1 : -1)};
+        }
+        send([operation]).then(renderCart).catch(function () {
+            form.submit();
+        });
+    });
+})();
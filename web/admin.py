@@ -1,3 +1,202 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.core import checks
+from django.utils.text import unescape_string_literal
 
-# Register your models here.
+from .exports import (
+    ORDER_EXPORT_HEADER, WATCH_EXPORT_HEADER, iter_order_rows, iter_watch_rows, stream_csv, stream_ndjson,
+)
+from .models import Watch, Brand, Gender, Type, Contact, User, Order, OrderItem, DailySales, Stock, Reservation
+from .reports import get_sales_dashboard
+
+
+class StreamingExportMixin:
+    """
+    Admin actions that stream the selected rows as CSV or NDJSON. Rows are
+    read through a server-side cursor while the response is being sent, so
+    large exports never sit in the worker's memory. Subclasses must set
+    export_rows, a function from a queryset to rows (see web/exports.py).
+    """
+    actions = ('export_csv', 'export_ndjson')
+    export_header = ()
+    export_name = 'export'
+    export_rows = None
+
+    def check(self, **kwargs):
+        errors = super().check(**kwargs)
+        if self.export_rows is None:
+            errors.append(checks.Error(
+                f"{type(self).__name__} must set export_rows.", obj=type(self), id='web.E001',
+            ))
+        return errors
+
+    @admin.action(description="Export selected rows as CSV")
+    def export_csv(self, request, queryset):
+        return stream_csv(self.export_rows(queryset), self.export_header, f'{self.export_name}.csv')
+
+    @admin.action(description="Export selected rows as NDJSON")
+    def export_ndjson(self, request, queryset):
+        return stream_ndjson(self.export_rows(queryset), self.export_header, f'{self.export_name}.ndjson')
+
+
+admin.site.register(User, UserAdmin)
+
+
+class PrefixSearchMixin:
+    """
+    Search for the whole query as one prefix (istartswith, backed by the
+    UPPER(...) text_pattern_ops indexes from migration 0012). The admin would
+    otherwise split "Allen Solly" into two words that must each match.
+
+    search_related lists lookups across a foreign key, such as
+    'brand__brand_name__istartswith'. Matches on the related model are
+    fetched first and added as fk IN (...): an OR across a join makes
+    PostgreSQL scan the whole table instead of combining two indexes.
+    """
+    search_related = ()
+
+    def get_search_related(self, request):
+        return self.search_related
+
+    def get_search_results(self, request, queryset, search_term):
+        phrase = search_term.strip()
+        if phrase[:1] in ('"', "'") and len(phrase) > 1 and phrase[-1] == phrase[0]:
+            phrase = unescape_string_literal(phrase)
+        escaped = phrase.replace('\\', '\\\\').replace('"', '\\"')
+        quoted = f'"{escaped}"' if phrase else ''
+        results, may_have_duplicates = super().get_search_results(request, queryset, quoted)
+        if phrase:
+            for field, _, lookup in (path.partition('__') for path in self.get_search_related(request)):
+                related = self.model._meta.get_field(field).related_model
+                pks = list(related._default_manager.filter(**{lookup: phrase}).values_list('pk', flat=True))
+                if pks:
+                    results |= queryset.filter(**{f'{field}__in': pks})
+        return results, may_have_duplicates
+
+
+class IdSearchMixin(PrefixSearchMixin):
+    """
+    Numeric queries search the id fields as well as the text fields, anything
+    else only the text fields, so an integer column never gets compared
+    against a word. Without text fields the id fields still show the search
+    box; a non-numeric query then matches nothing.
+    """
+    id_search_fields = ()
+
+    def get_search_fields(self, request):
+        if request.GET.get('q', '').strip().isdigit():
+            return tuple(self.id_search_fields) + tuple(self.search_fields)
+        return self.search_fields or self.id_search_fields
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term and not term.isdigit() and not (self.search_fields or self.get_search_related(request)):
+            return queryset.none(), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(Brand)
+class BrandAdmin(PrefixSearchMixin, admin.ModelAdmin):
+    list_display = ('brand_id', 'brand_name')
+    search_fields = ('brand_name__istartswith',)
+
+
+@admin.register(Gender)
+class GenderAdmin(admin.ModelAdmin):
+    list_display = ('gender_id', 'gender_name')
+
+
+@admin.register(Type)
+class TypeAdmin(admin.ModelAdmin):
+    list_display = ('type_id', 'type_name')
+
+
+@admin.register(Watch)
+class WatchAdmin(IdSearchMixin, StreamingExportMixin, admin.ModelAdmin):
+    list_display = ('watch_id', 'title', 'brand', 'gender', 'type', 'price')
+    list_select_related = ('brand', 'gender', 'type')
+    list_filter = ('gender', 'type')
+    raw_id_fields = ('brand', 'gender', 'type')
+    # Id lookups and indexed prefix searches only, never a LIKE '%...%' scan.
+    id_search_fields = ('watch_id__exact',)
+    search_fields = ('title__istartswith',)
+    search_related = ('brand__brand_name__istartswith',)
+    show_full_result_count = False
+    export_header = WATCH_EXPORT_HEADER
+    export_name = 'watches'
+    export_rows = staticmethod(iter_watch_rows)
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ('product',)
+    extra = 0
+
+
+@admin.register(Order)
+class OrderAdmin(IdSearchMixin, StreamingExportMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'email', 'status', 'payment_method', 'total_price', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('status', 'payment_method')
+    raw_id_fields = ('user',)
+    id_search_fields = ('id__exact',)
+    search_fields = ('email__istartswith',)
+    search_related = ('user__username__istartswith',)
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+    inlines = (OrderItemInline,)
+    export_header = ORDER_EXPORT_HEADER
+    export_name = 'orders'
+    export_rows = staticmethod(iter_order_rows)
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(IdSearchMixin, admin.ModelAdmin):
+    list_display = ('id', 'order', 'product', 'price', 'quantity')
+    list_select_related = ('order__user', 'product__brand', 'product__gender', 'product__type')
+    raw_id_fields = ('order', 'product')
+    id_search_fields = ('order__id__exact', 'product__watch_id__exact')
+    show_full_result_count = False
+
+
+@admin.register(Contact)
+class ContactAdmin(PrefixSearchMixin, admin.ModelAdmin):
+    list_display = ('first_name', 'last_name', 'email')
+    search_fields = ('email__istartswith',)
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """Sales dashboard. Everything here reads the summary table only."""
+    list_display = ('date', 'brand', 'gender', 'type', 'orders', 'units', 'revenue')
+    list_select_related = ('brand', 'gender', 'type')
+    list_filter = ('gender', 'type')
+    date_hierarchy = 'date'
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = {**get_sales_dashboard(), **(extra_context or {})}
+        return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(Stock)
+class StockAdmin(IdSearchMixin, admin.ModelAdmin):
+    list_display = ('watch', 'available')
+    list_select_related = ('watch',)
+    raw_id_fields = ('watch',)
+    id_search_fields = ('watch__watch_id__exact',)
+    show_full_result_count = False
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ('session_key', 'watch', 'quantity', 'expires_at')
+    list_select_related = ('watch',)
+    raw_id_fields = ('watch',)
+    show_full_result_count = False
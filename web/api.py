@@ -0,0 +1,112 @@
+"""
+Read-only JSON catalog API. Listings use the same filters and sort options
+as the shop page, with keyset cursors for paging. Responses carry an ETag
+and Last-Modified taken from the catalog version, so clients polling an
+unchanged catalog get a 304 without the view running.
+"""
+from datetime import datetime, timezone
+
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_safe
+
+from .catalog import filter_watches, get_catalog_version, get_filters, get_lookups, get_ordering
+from .models import Watch
+from .pagination import KeysetPaginator
+
+WATCH_API_FIELDS = ('watch_id', 'title', 'price', 'image_url', 'brand', 'gender', 'type')
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+
+class APIError(ValueError):
+    pass
+
+
+def catalog_etag(request, *args, **kwargs):
+    return f'catalog-{get_catalog_version()}'
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(get_catalog_version() / 1000, tz=timezone.utc)
+
+
+def get_fields(params):
+    """Fields named in ?fields=title,price (watch_id is always included)."""
+    if not params.get('fields'):
+        return WATCH_API_FIELDS
+    fields = [field for field in params['fields'].split(',') if field]
+    unknown = [field for field in fields if field not in WATCH_API_FIELDS]
+    if unknown:
+        raise APIError(f'Unknown fields: {", ".join(unknown)}. Choose from {", ".join(WATCH_API_FIELDS)}.')
+    return ('watch_id', *(field for field in fields if field != 'watch_id'))
+
+
+def get_page_size(params):
+    try:
+        size = int(params.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        raise APIError('"limit" must be an integer.') from None
+    return max(1, min(size, API_MAX_PAGE_SIZE))
+
+
+def serialize_watch(watch, fields, lookups):
+    related = {
+        'brand': lambda: getattr(lookups.brands.get(watch.brand_id), 'brand_name', None),
+        'gender': lambda: getattr(lookups.genders.get(watch.gender_id), 'gender_name', None),
+        'type': lambda: getattr(lookups.types.get(watch.type_id), 'type_name', None),
+    }
+    return {
+        field: related[field]() if field in related else getattr(watch, field)
+        for field in fields
+    }
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+@gzip_page
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def watch_list_api(request):
+    try:
+        fields = get_fields(request.GET)
+        page_size = get_page_size(request.GET)
+    except APIError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    lookups = get_lookups()
+    ordering = get_ordering(request.GET)
+    # Only the requested columns (plus the sort key) are read. Brand, gender
+    # and type names come from the in-memory lookups rather than joins.
+    watches = filter_watches(get_filters(request.GET), lookups=lookups).only(*fields, *ordering)
+    page = KeysetPaginator(watches, page_size, ordering).get_page(request.GET.get('cursor'))
+
+    return JsonResponse({
+        'results': [serialize_watch(watch, fields, lookups) for watch in page],
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    })
+
+
+@gzip_page
+@require_safe
+@cache_control(no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def watch_detail_api(request, watch_id):
+    try:
+        fields = get_fields(request.GET)
+    except APIError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    watch = Watch.objects.only(*fields).filter(watch_id=watch_id).first()
+    if watch is None:
+        return JsonResponse({'error': 'Watch not found.'}, status=404)
+    return JsonResponse(serialize_watch(watch, fields, get_lookups()))
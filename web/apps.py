@@ -1,6 +1,23 @@
+from pathlib import Path
+
 from django.apps import AppConfig
+from django.conf import settings
+from django.template.loader import get_template
 
 
 class WebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'web'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+
+
+def warm_templates():
+    # Compile every project template into the cached template loader. Called
+    # by webpage/wsgi.py and asgi.py, so management commands skip it.
+    if not settings.TEMPLATE_WARMUP:
+        return
+    for directory in map(Path, settings.TEMPLATES[0]['DIRS']):
+        for path in sorted(directory.rglob('*.html')):
+            get_template(path.relative_to(directory).as_posix())
@@ -0,0 +1,145 @@
+"""
+Async versions of the catalog and cart views, used instead of the ones in
+views.py when ASYNC_VIEWS is set and the site runs under an ASGI server
+(uvicorn, or gunicorn with uvicorn workers). Database and cache reads go
+through the async ORM and cache API, so a worker can wait on many slow
+clients at once. Templates still render in a thread via sync_to_async,
+since the template engine is synchronous.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_http_methods
+
+from .cart import CART_SESSION_KEY, Cart, CartError, added_watch_ids, check_added_watches, parse_operations
+from .catalog import aget_featured_watches, aget_lookups, filter_watches, get_filters, get_ordering
+from .models import Watch
+from .page_cache import CATALOG_TAGS, cache_anonymous_page
+from .pagination import KeysetPaginator, estimate_count
+from .search import search_watches
+from .stock import in_stock
+from .views import SHOP_PARAMS, SHOP_TAGS, shop_context
+
+arender = sync_to_async(render)
+
+
+async def aload_cart(request):
+    # Loading the session through its async API means the Cart's plain dict
+    # access afterwards never blocks on the session store.
+    await request.session.aget(CART_SESSION_KEY)
+    return Cart(request.session)
+
+
+async def apaginate(queryset, per_page, number, approximate_count=False):
+    paginator = Paginator(queryset, per_page)
+    if approximate_count:
+        paginator.count = await sync_to_async(estimate_count)(queryset)
+    else:
+        paginator.count = await queryset.acount()
+    page_obj = paginator.get_page(number)
+    page_obj.object_list = [obj async for obj in page_obj.object_list]
+    return page_obj
+
+
+@cache_anonymous_page(tags=CATALOG_TAGS)
+async def index(request):
+    return await arender(request, 'index.html', {'watches': await aget_featured_watches()})
+
+
+@cache_anonymous_page(tags=SHOP_TAGS, params=SHOP_PARAMS)
+async def shop_view(request):
+    filters = get_filters(request.GET)
+    ordering = get_ordering(request.GET)
+    search_query = request.GET.get('q', '').strip()
+    lookups = await aget_lookups()
+    watches = filter_watches(filters, Watch.objects.select_related('image'), lookups=lookups)
+    if request.GET.get('in_stock'):
+        watches = in_stock(watches)
+    keyset_pagination = settings.SHOP_PAGINATION == 'keyset' and not search_query
+
+    if search_query:
+        results = await sync_to_async(search_watches)(watches, search_query)
+        page_obj = await apaginate(results, 9, request.GET.get('page'))
+    elif keyset_pagination:
+        paginator = KeysetPaginator(watches, 9, ordering, approximate_count=settings.SHOP_APPROXIMATE_COUNT)
+        page_obj = await sync_to_async(paginator.get_page)(request.GET.get('cursor'))
+    else:
+        page_obj = await apaginate(
+            watches.order_by(*ordering), 9, request.GET.get('page'), settings.SHOP_APPROXIMATE_COUNT,
+        )
+
+    lookups.attach(page_obj)
+    context = shop_context(request, filters, search_query, page_obj, keyset_pagination)
+    return await arender(request, 'shop.html', context)
+
+
+@login_required(login_url='login_register')
+async def add_to_cart(request, watch_id):
+    try:
+        watch = await Watch.objects.aget(watch_id=watch_id)
+    except Watch.DoesNotExist:
+        return HttpResponse("Watch not found.", status=404)
+
+    cart = await aload_cart(request)
+    cart.add(watch.watch_id)
+    messages.success(request, f"{watch.title} has been added to your cart.")
+    return redirect('shop')
+
+
+async def cart_view(request):
+    cart = await aload_cart(request)
+    priced = await cart.aget_priced()
+    return await arender(request, 'cart.html', {'cart': priced['lines'], 'total_price': priced['total']})
+
+
+@require_http_methods(['GET', 'POST'])
+async def cart_api(request):
+    cart = await aload_cart(request)
+    if request.method == 'POST':
+        try:
+            operations = parse_operations(json.loads(request.body))
+            user = await request.auser()
+            added = added_watch_ids(operations)
+            existing_ids = []
+            if added and user.is_authenticated:
+                existing_ids = [pk async for pk in Watch.objects.filter(watch_id__in=added).values_list('watch_id', flat=True)]
+            check_added_watches(operations, user.is_authenticated, existing_ids)
+            cart.apply(operations)
+        except CartError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be JSON.'}, status=400)
+    return JsonResponse(cart.serialize(await cart.aget_priced()))
+
+
+async def update_quantity(request, watch_id, action):
+    cart = await aload_cart(request)
+
+    if watch_id not in cart:
+        return HttpResponse('Item not in cart', status=404)
+
+    quantity = cart.items[str(watch_id)]
+    if action == 'increase':
+        cart.set(watch_id, quantity + 1)
+    elif action == 'decrease':
+        cart.set(watch_id, quantity - 1)
+
+    return redirect('cart')
+
+
+async def remove_item(request, watch_id):
+    cart = await aload_cart(request)
+
+    if watch_id in cart:
+        cart.remove(watch_id)
+        messages.success(request, "Item removed from the cart.")
+    else:
+        messages.error(request, "Item not found in the cart.")
+
+    return redirect('cart')
@@ -0,0 +1,40 @@
+import csv
+import math
+from itertools import cycle, islice
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(samples):
+    """Count, mean and p50/p95/p99 of timings given in seconds, reported in milliseconds."""
+    count = len(samples)
+    return {
+        'count': count,
+        'mean_ms': round(sum(samples) / count * 1000, 3) if count else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def write_synthetic_watches(source, path, count):
+    """
+    Write a feed of `count` watches to `path` for `import_catalog --watches`
+    by cycling through the rows of `source` (Csv files/watches.csv) under new
+    watch_ids 1..count. Brand, gender and type ids are kept, so the fixture
+    dimension files still apply.
+    """
+    from web.management.commands.import_catalog import read_csv_rows
+
+    rows = list(read_csv_rows(source))
+    with open(path, 'w', newline='', encoding='utf-8') as feed:
+        writer = csv.writer(feed)
+        for watch_id, row in enumerate(islice(cycle(rows), count), start=1):
+            writer.writerow([watch_id, *row[1:]])
+    return path
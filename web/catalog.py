@@ -0,0 +1,272 @@
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Watch, Brand, Gender, Type
+
+CATALOG_VERSION_KEY = 'catalog:version'
+FACET_CACHE_TIMEOUT = 60 * 60
+
+FILTER_PARAMS = ('brand', 'gender', 'type', 'price_range')
+
+PRICE_RANGES = {
+    "0-50": (0, 50),
+    "51-100": (51, 100),
+    "101-200": (101, 200),
+    "201-500": (201, 500),
+    "500+": (500, None),
+}
+
+SHOP_ORDERINGS = {
+    "": ('watch_id',),
+    "price": ('price', 'watch_id'),
+}
+
+PRICE_RANGE_LABELS = {
+    "0-50": "$0 - $50",
+    "51-100": "$51 - $100",
+    "101-200": "$101 - $200",
+    "201-500": "$201 - $500",
+    "500+": "$500+",
+}
+
+
+# Catalog version
+# Every cache entry derived from the catalog has the version in its key, so
+# bumping the version (see web/signals.py) invalidates all of them at once.
+def get_catalog_version():
+    return cache.get_or_set(CATALOG_VERSION_KEY, lambda: int(time.time() * 1000), None)
+
+
+async def aget_catalog_version():
+    return await cache.aget_or_set(CATALOG_VERSION_KEY, lambda: int(time.time() * 1000), None)
+
+
+def bump_catalog_version():
+    version = max(int(time.time() * 1000), get_catalog_version() + 1)
+    cache.set(CATALOG_VERSION_KEY, version, None)
+    return version
+
+
+# Lookup tables
+class CatalogLookups:
+    """
+    Brand, Gender and Type rows with name -> id maps, loaded once per catalog
+    version and kept in process memory.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.brands = {brand.pk: brand for brand in Brand.objects.order_by('brand_name')}
+        self.genders = {gender.pk: gender for gender in Gender.objects.order_by('gender_name')}
+        self.types = {watch_type.pk: watch_type for watch_type in Type.objects.order_by('type_name')}
+        self.brand_ids = {brand.brand_name: pk for pk, brand in self.brands.items()}
+        self.gender_ids = {gender.gender_name: pk for pk, gender in self.genders.items()}
+        self.type_ids = {watch_type.type_name: pk for pk, watch_type in self.types.items()}
+
+    def attach(self, watches):
+        # Fill the brand/gender/type caches of the given watches, so templates
+        # and Watch.__str__ do not load each of them lazily.
+        relations = (
+            (Watch.brand.field, 'brand_id', self.brands),
+            (Watch.gender.field, 'gender_id', self.genders),
+            (Watch.type.field, 'type_id', self.types),
+        )
+        for watch in watches:
+            for field, attname, objects in relations:
+                related = objects.get(getattr(watch, attname))
+                if related is not None and not field.is_cached(watch):
+                    field.set_cached_value(watch, related)
+        return watches
+
+
+_lookups = None
+
+
+def get_lookups():
+    global _lookups
+    version = get_catalog_version()
+    if _lookups is None or _lookups.version != version:
+        _lookups = CatalogLookups(version)
+    return _lookups
+
+
+async def aget_lookups():
+    version = await aget_catalog_version()
+    if _lookups is None or _lookups.version != version:
+        return await sync_to_async(get_lookups)()
+    return _lookups
+
+
+# Home page
+def get_featured_watches(count=12):
+    """Newest watches for the home page, cached until the catalog changes."""
+    key = f'catalog:featured:{count}:{get_catalog_version()}'
+    watches = cache.get(key)
+    if watches is None:
+        watches = get_lookups().attach(list(Watch.objects.select_related('image').order_by('-watch_id')[:count]))
+        cache.set(key, watches, FACET_CACHE_TIMEOUT)
+    return watches
+
+
+async def aget_featured_watches(count=12):
+    key = f'catalog:featured:{count}:{await aget_catalog_version()}'
+    watches = await cache.aget(key)
+    if watches is None:
+        watches = [watch async for watch in Watch.objects.select_related('image').order_by('-watch_id')[:count]]
+        (await aget_lookups()).attach(watches)
+        await cache.aset(key, watches, FACET_CACHE_TIMEOUT)
+    return watches
+
+
+# Filtering
+def get_filters(params):
+    return {name: params.get(name) or None for name in FILTER_PARAMS}
+
+
+def get_ordering(params):
+    return SHOP_ORDERINGS.get(params.get('sort', ''), SHOP_ORDERINGS[""])
+
+
+def price_range_q(price_range):
+    min_price, max_price = PRICE_RANGES.get(price_range, (None, None))
+    q = Q()
+    if min_price is not None:
+        q &= Q(price__gte=min_price)
+    if max_price is not None:
+        q &= Q(price__lte=max_price)
+    return q
+
+
+def resolve_filter_ids(filters, lookups=None):
+    # Names from the filter form are resolved to primary keys up front, so the
+    # watch query filters on indexed foreign key columns instead of joining
+    # the lookup tables. Unknown names resolve to None.
+    lookups = lookups or get_lookups()
+    ids = {}
+    if filters['brand']:
+        ids['brand_id'] = lookups.brand_ids.get(filters['brand'])
+    if filters['gender']:
+        ids['gender_id'] = lookups.gender_ids.get(filters['gender'])
+    if filters['type']:
+        ids['type_id'] = lookups.type_ids.get(filters['type'])
+    return ids
+
+
+def filter_watches(filters, watches=None, lookups=None):
+    if watches is None:
+        watches = Watch.objects.all()
+
+    for field, pk in resolve_filter_ids(filters, lookups).items():
+        if pk is None:
+            return watches.none()
+        watches = watches.filter(**{field: pk})
+
+    if filters['price_range']:
+        watches = watches.filter(price_range_q(filters['price_range']))
+
+    return watches
+
+
+# Facets
+def get_facet_cube():
+    """
+    Watch counts grouped by (brand_id, gender_id, type_id), with one count
+    column per price range. The cube is built with a single aggregated query
+    and cached until the catalog changes; facet counts for any filter
+    combination are summed from it without touching the database.
+    """
+    key = f'catalog:facet-cube:{get_catalog_version()}'
+    cube = cache.get(key)
+    if cube is None:
+        price_counts = {
+            f'price_{index}': Count('pk', filter=price_range_q(price_range))
+            for index, price_range in enumerate(PRICE_RANGES)
+        }
+        rows = (
+            Watch.objects.order_by()
+            .values('brand_id', 'gender_id', 'type_id')
+            .annotate(total=Count('pk'), **price_counts)
+        )
+        cube = [
+            (
+                row['brand_id'],
+                row['gender_id'],
+                row['type_id'],
+                row['total'],
+                tuple(row[name] for name in price_counts),
+            )
+            for row in rows
+        ]
+        cache.set(key, cube, FACET_CACHE_TIMEOUT)
+    return cube
+
+
+def _selected_id(ids, field):
+    if field not in ids:
+        return None
+    # Unknown names resolve to None; 0 is never a valid id, so they match nothing.
+    return ids[field] or 0
+
+
+def compute_facets(cube, lookups, filters):
+    ids = resolve_filter_ids(filters, lookups)
+    brand_id = _selected_id(ids, 'brand_id')
+    gender_id = _selected_id(ids, 'gender_id')
+    type_id = _selected_id(ids, 'type_id')
+    price_ranges = list(PRICE_RANGES)
+    price_index = price_ranges.index(filters['price_range']) if filters['price_range'] in PRICE_RANGES else None
+
+    brand_counts, gender_counts, type_counts = {}, {}, {}
+    price_counts = [0] * len(price_ranges)
+
+    # Each facet is counted with every filter applied except its own, so the
+    # numbers show what selecting that option would return.
+    for cell_brand, cell_gender, cell_type, total, by_price in cube:
+        matches_brand = brand_id is None or cell_brand == brand_id
+        matches_gender = gender_id is None or cell_gender == gender_id
+        matches_type = type_id is None or cell_type == type_id
+        count = total if price_index is None else by_price[price_index]
+
+        if matches_gender and matches_type:
+            brand_counts[cell_brand] = brand_counts.get(cell_brand, 0) + count
+        if matches_brand and matches_type:
+            gender_counts[cell_gender] = gender_counts.get(cell_gender, 0) + count
+        if matches_brand and matches_gender:
+            type_counts[cell_type] = type_counts.get(cell_type, 0) + count
+        if matches_brand and matches_gender and matches_type:
+            for index, price_count in enumerate(by_price):
+                price_counts[index] += price_count
+
+    return {
+        'brands': [
+            {'name': brand.brand_name, 'count': brand_counts.get(pk, 0)}
+            for pk, brand in lookups.brands.items()
+        ],
+        'genders': [
+            {'name': gender.gender_name, 'count': gender_counts.get(pk, 0)}
+            for pk, gender in lookups.genders.items()
+        ],
+        'types': [
+            {'name': watch_type.type_name, 'count': type_counts.get(pk, 0)}
+            for pk, watch_type in lookups.types.items()
+        ],
+        'price_ranges': [
+            {'name': price_range, 'label': PRICE_RANGE_LABELS[price_range], 'count': price_counts[index]}
+            for index, price_range in enumerate(price_ranges)
+        ],
+    }
+
+
+def get_facets(filters):
+    combination = '|'.join(filters[name] or '' for name in FILTER_PARAMS)
+    digest = hashlib.md5(combination.encode()).hexdigest()
+    key = f'catalog:facets:{get_catalog_version()}:{digest}'
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(get_facet_cube(), get_lookups(), filters)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,9 @@
+from django.utils.functional import SimpleLazyObject
+
+from .catalog import get_catalog_version
+
+
+def catalog(request):
+    # Used as a key by the {% cache %} fragments in the templates. Lazy, so
+    # pages without cached fragments never read the version.
+    return {'catalog_version': SimpleLazyObject(get_catalog_version)}
@@ -0,0 +1,77 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .models import Watch, Order
+
+# Rows are fetched in chunks through a server-side cursor on PostgreSQL, so
+# memory use stays flat however large the table is.
+EXPORT_CHUNK_SIZE = 2000
+
+# Same column order as Csv files/watches.csv, so exports load back with
+# import_catalog.
+WATCH_EXPORT_FIELDS = ['watch_id', 'title', 'brand_id', 'image_url', 'price', 'gender_id', 'type_id']
+
+ORDER_EXPORT_FIELDS = [
+    'id', 'created_at', 'user__username', 'email', 'status', 'payment_method', 'total_price',
+    'shipping_address', 'shipping_city', 'shipping_postal_code', 'shipping_country',
+]
+WATCH_EXPORT_HEADER = WATCH_EXPORT_FIELDS
+ORDER_EXPORT_HEADER = [field.split('__')[-1] for field in ORDER_EXPORT_FIELDS]
+
+
+def iter_watch_rows(queryset=None):
+    if queryset is None:
+        queryset = Watch.objects.all()
+    rows = queryset.order_by('watch_id').values_list(*WATCH_EXPORT_FIELDS)
+    yield from rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def iter_order_rows(queryset=None):
+    if queryset is None:
+        queryset = Order.objects.all()
+    rows = queryset.order_by('id').values_list(*ORDER_EXPORT_FIELDS)
+    yield from rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def write_csv(output, rows, header=None):
+    writer = csv.writer(output)
+    if header:
+        writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+class Echo:
+    """File-like object whose write() hands the line back for streaming."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, header, filename):
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_ndjson(rows, header, filename):
+    def lines():
+        for row in rows:
+            yield json.dumps(dict(zip(header, row, strict=True)), cls=DjangoJSONEncoder) + '\n'
+
+    response = StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
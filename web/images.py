@@ -0,0 +1,102 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+from django.conf import settings
+from PIL import Image
+
+from .models import Watch, WatchImage
+
+THUMBNAIL_FORMAT = 'WEBP'
+THUMBNAIL_CONTENT_TYPE = 'image/webp'
+THUMBNAIL_QUALITY = 80
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+def source_version(record):
+    # Prefix of the source image's SHA-256, used as the ?v= cache buster, so
+    # the URL changes whenever the image does, even if its URL stays the same.
+    return record.content_hash[:12]
+
+
+def image_version(watch):
+    """
+    source_version of the watch's thumbnails, or None when they were not
+    loaded with select_related('image') or are out of date. Never queries.
+    """
+    if not Watch.image.is_cached(watch):
+        return None
+    record = Watch.image.related.get_cached_value(watch)
+    if record is None or record.source_url != watch.image_url:
+        return None
+    return source_version(record)
+
+
+def thumbnail_name(content_hash, width):
+    return f'thumbs/{content_hash[:2]}/{content_hash}-{width}.webp'
+
+
+def thumbnail_path(content_hash, width):
+    return Path(settings.MEDIA_ROOT) / thumbnail_name(content_hash, width)
+
+
+def fetch_image(url):
+    if urlsplit(url).scheme not in settings.IMAGE_FETCH_SCHEMES:
+        raise ImageFetchError(f"Refusing to fetch {url!r}")
+    try:
+        with urlopen(url, timeout=settings.IMAGE_FETCH_TIMEOUT) as response:
+            data = response.read(MAX_SOURCE_BYTES + 1)
+    except (OSError, ValueError) as error:
+        raise ImageFetchError(f"Could not fetch {url!r}: {error}") from error
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ImageFetchError(f"{url!r} is larger than {MAX_SOURCE_BYTES} bytes")
+    return data
+
+
+def write_thumbnails(data, content_hash):
+    try:
+        source = Image.open(BytesIO(data))
+        source.load()
+    except (OSError, Image.DecompressionBombError) as error:
+        raise ImageFetchError(f"Not a usable image: {error}") from error
+    source = source.convert('RGB')
+
+    for width in settings.THUMBNAIL_WIDTHS:
+        path = thumbnail_path(content_hash, width)
+        if path.exists():
+            continue
+        height = max(1, round(source.height * width / source.width))
+        thumbnail = source.resize((width, height), Image.LANCZOS) if width < source.width else source
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary name first so a concurrent request never
+        # serves a half-written file.
+        fd, partial = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as output:
+            thumbnail.save(output, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        os.replace(partial, path)
+
+
+def build_thumbnails(watch):
+    """
+    Fetch the watch's image_url, write one thumbnail per THUMBNAIL_WIDTHS and
+    record the content hash. Watches sharing a source image share the files.
+    """
+    data = fetch_image(watch.image_url)
+    content_hash = hashlib.sha256(data).hexdigest()
+    write_thumbnails(data, content_hash)
+    record, _ = WatchImage.objects.update_or_create(
+        watch=watch, defaults={'source_url': watch.image_url, 'content_hash': content_hash},
+    )
+    return record
+
+
+def thumbnails_exist(record):
+    return all(thumbnail_path(record.content_hash, width).exists() for width in settings.THUMBNAIL_WIDTHS)
@@ -0,0 +1,88 @@
+import asyncio
+import threading
+import time
+from types import ModuleType
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+
+from web import async_views, views
+from web.bench import summarize
+from web.urls import build_urlpatterns
+
+DEFAULT_PATHS = ['/', '/shop/', '/shop/?sort=price', '/shop/?q=analog', '/cart/']
+
+
+def urlconf(catalog_views):
+    module = ModuleType(f'bench_urls_{catalog_views.__name__}')
+    module.urlpatterns = [path('', include(build_urlpatterns(catalog_views)))]
+    return module
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec and latency of the sync views behind the WSGI handler with the async "
+        "views behind the ASGI handler, at the same concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per worker and phase.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Threads (WSGI) or tasks (ASGI).")
+        parser.add_argument('--path', action='append', dest='paths', help="Path to request; repeatable.")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        phases = [
+            ('wsgi sync views', views, self.run_wsgi),
+            ('asgi async views', async_views, self.run_asgi),
+        ]
+        for label, catalog_views, run in phases:
+            with override_settings(ROOT_URLCONF=urlconf(catalog_views), ALLOWED_HOSTS=['*']):
+                started = time.perf_counter()
+                samples = run(paths, options['requests'], options['concurrency'])
+                elapsed = time.perf_counter() - started
+            stats = summarize(samples)
+            self.stdout.write(
+                f"{label:<17} rps={stats['count'] / elapsed:.1f} p50={stats['p50_ms']:.3f}ms "
+                f"p95={stats['p95_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms"
+            )
+
+    def run_wsgi(self, paths, requests, concurrency):
+        samples = []
+        lock = threading.Lock()
+
+        def worker():
+            client = Client()
+            timings = []
+            for i in range(requests):
+                started = time.perf_counter()
+                client.get(paths[i % len(paths)])
+                timings.append(time.perf_counter() - started)
+            connections.close_all()
+            with lock:
+                samples.extend(timings)
+
+        workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return samples
+
+    def run_asgi(self, paths, requests, concurrency):
+        async def worker():
+            client = AsyncClient()
+            timings = []
+            for i in range(requests):
+                started = time.perf_counter()
+                await client.get(paths[i % len(paths)])
+                timings.append(time.perf_counter() - started)
+            return timings
+
+        async def main():
+            results = await asyncio.gather(*(worker() for _ in range(concurrency)))
+            return [sample for timings in results for sample in timings]
+
+        return asyncio.run(main())
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+
+from web.bench import summarize
+from web.models import Watch
+
+UNPOOLED_ALIAS = 'bench_unpooled'
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate requests that run one catalog query and compare latency when every request "
+        "closes its connection against the configured reuse (CONN_MAX_AGE or DB_POOL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per thread and phase.")
+        parser.add_argument('--threads', type=int, default=4, help="Concurrent workers.")
+
+    def handle(self, *args, **options):
+        pool = connection.settings_dict.get('OPTIONS', {}).get('pool', False)
+        self.stdout.write(
+            f"vendor={connection.vendor} CONN_MAX_AGE={connection.settings_dict['CONN_MAX_AGE']} pool={bool(pool)}"
+        )
+        # Closing a pooled connection only returns it to the pool, so the
+        # first phase runs on a copy of the database settings without it.
+        phases = [
+            ('close after each request', self.unpooled_alias(), True),
+            ('configured reuse', DEFAULT_DB_ALIAS, False),
+        ]
+        for label, alias, close in phases:
+            stats = summarize(self.run(options['requests'], options['threads'], alias, close))
+            self.stdout.write(
+                f"{label:<26} p50={stats['p50_ms']:.3f}ms p95={stats['p95_ms']:.3f}ms "
+                f"p99={stats['p99_ms']:.3f}ms mean={stats['mean_ms']:.3f}ms"
+            )
+
+    def unpooled_alias(self):
+        options = {key: value for key, value in connection.settings_dict['OPTIONS'].items() if key != 'pool'}
+        connections.settings[UNPOOLED_ALIAS] = {**connection.settings_dict, 'OPTIONS': options}
+        return UNPOOLED_ALIAS
+
+    def run(self, requests, threads, alias, close):
+        samples = []
+        lock = threading.Lock()
+
+        def worker():
+            db = connections[alias]
+            timings = []
+            for _ in range(requests):
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                list(Watch.objects.using(alias).order_by('watch_id').values_list('watch_id', flat=True)[:9])
+                if close:
+                    db.close()
+                # Applies CONN_MAX_AGE / returns pooled connections, as after a real request.
+                request_finished.send(sender=self.__class__)
+                timings.append(time.perf_counter() - started)
+            db.close()
+            with lock:
+                samples.extend(timings)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return samples
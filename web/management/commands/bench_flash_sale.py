@@ -0,0 +1,101 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from web.bench import summarize
+from web.cart import CART_SESSION_KEY, Cart, encode_items
+from web.models import Order, OutboundEmail, Stock, User, Watch
+from web.orders import create_order
+from web.stock import OutOfStock
+
+
+class Command(BaseCommand):
+    help = (
+        "Flash sale: many concurrent checkouts of one watch with limited stock. Reports how many "
+        "orders went through, checkout latency, and whether any unit was oversold. Orders it creates "
+        "and their confirmation emails are deleted and the watch's stock is restored afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', type=int, help="watch_id to sell (defaults to the first watch).")
+        parser.add_argument('--units', type=int, default=50, help="Units in stock at the start.")
+        parser.add_argument('--buyers', type=int, default=300, help="Checkouts attempted, one unit each.")
+        parser.add_argument('--threads', type=int, default=32, help="Concurrent checkouts.")
+
+    def handle(self, *args, **options):
+        watch = Watch.objects.filter(watch_id=options['watch']).first() if options['watch'] else Watch.objects.order_by('watch_id').first()
+        if watch is None:
+            raise CommandError("No watch to sell; load the catalog first.")
+        buyer, _ = User.objects.get_or_create(
+            username='flash-sale-bench', defaults={'email': 'flash-sale-bench@example.invalid'},
+        )
+        previous = Stock.objects.filter(watch=watch).first()
+        Stock.objects.update_or_create(watch=watch, defaults={'available': options['units']})
+
+        try:
+            results = self.run(watch, buyer, options['buyers'], options['threads'])
+            remaining = Stock.objects.get(watch=watch).available
+            sold = Order.objects.filter(user=buyer).count()
+        finally:
+            Order.objects.filter(user=buyer).delete()
+            OutboundEmail.objects.filter(recipients=buyer.email).delete()
+            if previous is None:
+                Stock.objects.filter(watch=watch).delete()
+            else:
+                Stock.objects.filter(watch=watch).update(available=previous.available)
+
+        expected = min(options['units'], options['buyers'])
+        stats = summarize(results['timings'])
+        self.stdout.write(
+            f"vendor={connection.vendor} units={options['units']} buyers={options['buyers']} threads={options['threads']}"
+        )
+        self.stdout.write(
+            f"orders={sold} sold_out_rejections={results['out_of_stock']} errors={results['errors']} "
+            f"remaining={remaining}"
+        )
+        self.stdout.write(
+            f"checkout p50={stats['p50_ms']:.3f}ms p95={stats['p95_ms']:.3f}ms p99={stats['p99_ms']:.3f}ms"
+        )
+        if sold > options['units'] or sold + remaining != options['units']:
+            raise CommandError(f"Oversold: {sold} orders for {options['units']} units, {remaining} left.")
+        if sold != expected:
+            self.stderr.write(f"Only {sold} of {expected} possible orders went through.")
+
+    def run(self, watch, buyer, buyers, threads):
+        results = {'timings': [], 'out_of_stock': 0, 'errors': 0}
+        lock = threading.Lock()
+        remaining = iter(range(buyers))
+
+        def worker():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                cart = Cart({CART_SESSION_KEY: encode_items({str(watch.watch_id): 1})})
+                started = time.perf_counter()
+                outcome = None
+                try:
+                    create_order(
+                        buyer, cart, shipping_address='1 Bench Street', shipping_city='Bench',
+                        shipping_postal_code='00000', shipping_country='Bench', email='bench@example.com',
+                        payment_method='credit_card',
+                    )
+                except OutOfStock:
+                    outcome = 'out_of_stock'
+                except DatabaseError:
+                    outcome = 'errors'
+                elapsed = time.perf_counter() - started
+                with lock:
+                    results['timings'].append(elapsed)
+                    if outcome:
+                        results[outcome] += 1
+            connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
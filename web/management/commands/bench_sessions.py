@@ -0,0 +1,70 @@
+import time
+from importlib import import_module
+
+from django.core.management.base import BaseCommand
+
+from web.bench import summarize
+from web.cart import Cart, encode_items
+
+ENGINES = [
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.file',
+    'django.contrib.sessions.backends.signed_cookies',
+]
+
+
+class Command(BaseCommand):
+    help = "Compare the cost of a cart mutation (session load + update + save) across session backends."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Cart mutations per backend.")
+        parser.add_argument('--lines', type=int, default=20, help="Distinct watches in the cart.")
+        parser.add_argument('--engine', action='append', dest='engines', help="Session engine to test (repeatable).")
+
+    def handle(self, *args, **options):
+        lines = options['lines']
+        self.stdout.write(f"{'engine':<50} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'bytes':>7}")
+        for engine in options['engines'] or ENGINES:
+            stats, size = self.bench(engine, options['requests'], lines)
+            self.stdout.write(
+                f"{engine:<50} {stats['mean_ms']:>9.3f} {stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f} {size:>7}"
+            )
+
+        legacy = {
+            str(watch_id): {
+                'watch_id': watch_id,
+                'name': 'NP2576WM01 Analog Watch - For Women',
+                'price': 3754.0,
+                'image_url': 'https://rukminim1.flixcart.com/image/612/612/l13whow0/watch/h/c/c/'
+                             '-original-imagcqzchcngfd7a.jpeg?q=70',
+                'quantity': 1,
+            }
+            for watch_id in range(1, lines + 1)
+        }
+        SessionStore = import_module('django.contrib.sessions.backends.db').SessionStore
+        compact = {'cart': encode_items({str(watch_id): 1 for watch_id in range(1, lines + 1)})}
+        self.stdout.write(
+            f"\nEncoded cart with {lines} lines: {len(SessionStore().encode({'cart': legacy}))} bytes as full "
+            f"lines, {len(SessionStore().encode(compact))} bytes compact."
+        )
+
+    def bench(self, engine, requests, lines):
+        SessionStore = import_module(engine).SessionStore
+        session = SessionStore()
+        session.save()
+        session_key = session.session_key
+
+        samples = []
+        for number in range(requests):
+            started = time.perf_counter()
+            session = SessionStore(session_key=session_key)
+            Cart(session).add(number % lines + 1)
+            session.save()
+            samples.append(time.perf_counter() - started)
+            session_key = session.session_key
+
+        size = len(session.encode(session._get_session()))
+        session.delete()
+        return summarize(samples), size
@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F, Q
+
+from web.images import ImageFetchError, build_thumbnails
+from web.models import Watch
+
+
+class Command(BaseCommand):
+    help = "Fetch watch images and write their thumbnails, skipping watches that are already up to date."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every watch, not only new or changed images.")
+        parser.add_argument('--workers', type=int, default=4, help="Images fetched in parallel.")
+
+    def handle(self, *args, **options):
+        watches = Watch.objects.only('watch_id', 'image_url').order_by('watch_id')
+        if not options['all']:
+            watches = watches.filter(Q(image__isnull=True) | ~Q(image__source_url=F('image_url')))
+
+        built = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for watch, error in executor.map(self.build, watches.iterator()):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Watch {watch.watch_id}: {error}")
+                else:
+                    built += 1
+        self.stdout.write(f"Built thumbnails for {built} watches, {failed} failed.")
+
+    def build(self, watch):
+        try:
+            build_thumbnails(watch)
+            return watch, None
+        except ImageFetchError as error:
+            return watch, error
+        finally:
+            connection.close()
@@ -0,0 +1,20 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from web.exports import ORDER_EXPORT_HEADER, iter_order_rows, write_csv
+
+
+class Command(BaseCommand):
+    help = "Export every order as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="File to write to (defaults to stdout).")
+
+    def handle(self, *args, **options):
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                count = write_csv(output, iter_order_rows(), ORDER_EXPORT_HEADER)
+            self.stderr.write(f"Exported {count} orders to {options['output']}.")
+        else:
+            write_csv(sys.stdout, iter_order_rows(), ORDER_EXPORT_HEADER)
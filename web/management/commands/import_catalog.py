@@ -0,0 +1,192 @@
+import csv
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from web.catalog import bump_catalog_version
+from web.page_cache import CATALOG_TAGS, invalidate_tags
+from web.models import Brand, Gender, Type, Watch
+
+# Column order of Csv files/watches.csv (the file has no header row)
+WATCH_COLUMNS = ['watch_id', 'title', 'brand_id', 'image_url', 'price', 'gender_id', 'type_id']
+WATCH_UPDATE_FIELDS = ['title', 'brand', 'image_url', 'price', 'gender', 'type']
+
+DIMENSIONS = [
+    ('brands.csv', Brand, 'brand_name'),
+    ('gender.csv', Gender, 'gender_name'),
+    ('type.csv', Type, 'type_name'),
+]
+
+
+def read_csv_rows(path):
+    # Stream rows one at a time and skip header lines, so feeds of any size
+    # are never held in memory.
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file):
+            if row and row[0].strip().isdigit():
+                yield row
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Import the watch catalog (brands, genders, types and watches) from CSV files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', default=Path(settings.BASE_DIR) / 'Csv files',
+            help="Directory holding brands.csv, gender.csv, type.csv and watches.csv.",
+        )
+        parser.add_argument('--watches', help="Watch feed to load instead of <dir>/watches.csv.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Watch rows written per batch.")
+        parser.add_argument(
+            '--method', choices=['auto', 'copy', 'bulk'], default='auto',
+            help="'copy' uses PostgreSQL COPY, 'bulk' uses bulk_create; 'auto' picks COPY on PostgreSQL.",
+        )
+
+    def handle(self, *args, **options):
+        csv_dir = Path(options['dir'])
+        watches_path = Path(options['watches'] or csv_dir / 'watches.csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be a positive number.")
+        if not watches_path.exists():
+            raise CommandError(f"Watch feed not found: {watches_path}")
+
+        method = options['method']
+        if method == 'auto':
+            method = 'copy' if connection.vendor == 'postgresql' else 'bulk'
+        elif method == 'copy' and connection.vendor != 'postgresql':
+            raise CommandError("COPY loading is only available on PostgreSQL.")
+
+        for filename, model, name_field in DIMENSIONS:
+            path = csv_dir / filename
+            if path.exists():
+                count = self.load_dimension(path, model, name_field)
+                self.stdout.write(f"{model.__name__}: {count} rows")
+
+        # Foreign keys are resolved against these in-memory id sets instead of
+        # looking up every watch row in the database.
+        brand_ids = set(Brand.objects.values_list('pk', flat=True))
+        gender_ids = set(Gender.objects.values_list('pk', flat=True))
+        type_ids = set(Type.objects.values_list('pk', flat=True))
+
+        self.title_length = Watch._meta.get_field('title').max_length
+        self.image_url_length = Watch._meta.get_field('image_url').max_length
+        self.skipped = 0
+        write_batch = self.copy_batch if method == 'copy' else self.bulk_batch
+
+        loaded = 0
+        started = time.perf_counter()
+        rows = self.parse_watches(watches_path, brand_ids, gender_ids, type_ids)
+        for batch in batched(rows, batch_size):
+            # Each batch commits on its own so locks on web_watch stay short.
+            with transaction.atomic():
+                write_batch(batch)
+            loaded += len(batch)
+            if options['verbosity'] > 1:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"  {loaded} watches ({loaded / elapsed:.0f} rows/sec)")
+
+        self.reset_sequences()
+        # bulk_create and COPY send no model signals, so invalidate catalog caches here.
+        bump_catalog_version()
+        invalidate_tags(*CATALOG_TAGS)
+
+        elapsed = time.perf_counter() - started
+        rate = loaded / elapsed if elapsed else loaded
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {loaded} watches in {elapsed:.2f}s ({rate:.0f} rows/sec, method={method}), "
+            f"skipped {self.skipped} invalid rows."
+        ))
+
+    def load_dimension(self, path, model, name_field):
+        objects = {}
+        for row in read_csv_rows(path):
+            objects[int(row[0])] = model(pk=int(row[0]), **{name_field: row[1].strip()})
+        # Only new and renamed rows are written. Re-saving an unchanged brand
+        # would still lock it, and a rename re-indexes all of its watches.
+        current = dict(model.objects.values_list('pk', name_field))
+        model.objects.bulk_create(
+            [obj for pk, obj in objects.items() if current.get(pk) != getattr(obj, name_field)],
+            update_conflicts=True,
+            unique_fields=[model._meta.pk.name],
+            update_fields=[name_field],
+        )
+        return len(objects)
+
+    def parse_watches(self, path, brand_ids, gender_ids, type_ids):
+        for row in read_csv_rows(path):
+            try:
+                watch_id, title, brand_id, image_url, price, gender_id, type_id = row
+                values = (
+                    int(watch_id),
+                    title.strip()[:self.title_length],
+                    int(brand_id),
+                    image_url.strip(),
+                    Decimal(price),
+                    int(gender_id),
+                    int(type_id),
+                )
+            except (ValueError, InvalidOperation):
+                self.skipped += 1
+                continue
+            # A cut-off URL would point nowhere, so overlong ones skip the row.
+            if len(values[3]) > self.image_url_length:
+                self.skipped += 1
+                continue
+            if values[2] not in brand_ids or values[5] not in gender_ids or values[6] not in type_ids:
+                self.skipped += 1
+                continue
+            yield values
+
+    def dedupe(self, batch):
+        # ON CONFLICT cannot touch the same row twice in one statement, so the
+        # last occurrence of a watch_id inside a batch wins.
+        return list({values[0]: values for values in batch}.values())
+
+    def bulk_batch(self, batch):
+        watches = [Watch(**dict(zip(WATCH_COLUMNS, values, strict=True))) for values in self.dedupe(batch)]
+        Watch.objects.bulk_create(
+            watches,
+            update_conflicts=True,
+            unique_fields=['watch_id'],
+            update_fields=WATCH_UPDATE_FIELDS,
+        )
+
+    def copy_batch(self, batch):
+        quote = connection.ops.quote_name
+        table = quote(Watch._meta.db_table)
+        columns = ', '.join(quote(column) for column in WATCH_COLUMNS)
+        updates = ', '.join(f'{quote(column)} = EXCLUDED.{quote(column)}' for column in WATCH_COLUMNS[1:])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMP TABLE IF NOT EXISTS import_watch (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'
+            )
+            cursor.execute('TRUNCATE import_watch')
+            with cursor.copy(f'COPY import_watch ({columns}) FROM STDIN') as copy:
+                for values in self.dedupe(batch):
+                    copy.write_row(values)
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) SELECT {columns} FROM import_watch '
+                f'ON CONFLICT ("watch_id") DO UPDATE SET {updates}'
+            )
+
+    def reset_sequences(self):
+        # Rows were inserted with explicit ids, so move the id sequences past them.
+        statements = connection.ops.sequence_reset_sql(no_style(), [Brand, Gender, Type, Watch])
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
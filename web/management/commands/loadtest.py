@@ -0,0 +1,372 @@
+import http.client
+import json
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from http.cookies import SimpleCookie
+from io import StringIO
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from web.bench import summarize, write_synthetic_watches
+from web.catalog import PRICE_RANGES
+from web.models import Brand, Gender, Order, OutboundEmail, Reservation, Stock, User, Watch
+from web.page_cache import invalidate_tags
+from web.stock import STOCK_TAG
+
+# Relative weight of each shopper action. A checkout is two requests: the
+# checkout page and the place_order POST.
+TRAFFIC_MIX = {
+    'home': 15,
+    'shop': 50,
+    'add_to_cart': 12,
+    'cart': 8,
+    'update_quantity': 6,
+    'remove_item': 4,
+    'checkout': 5,
+}
+# Visitors who are not logged in only browse, and are mostly served from
+# the anonymous page cache.
+ANONYMOUS_TRAFFIC_MIX = {
+    'home': 25,
+    'shop': 75,
+}
+IDEMPOTENCY_KEY_RE = re.compile(r'name="idempotency_key" value="([^"]+)"')
+
+
+class ClientSession:
+    """Sends requests through the Django test client, in process."""
+
+    def __init__(self, user):
+        self.client = Client(raise_request_exception=False)
+        if user is not None:
+            self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        response = getattr(self.client, method)(path, data)
+        return response.status_code, response.content.decode()
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPSession:
+    """Sends requests over a keep-alive HTTP connection, keeping its own cookies."""
+
+    def __init__(self, user, base_url):
+        parts = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+        self.cookies = SimpleCookie()
+        if user is not None:
+            # Reuse a session made by force_login; the server must share the session store.
+            login = Client()
+            login.force_login(user)
+            self.cookies[settings.SESSION_COOKIE_NAME] = login.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def request(self, method, path, data=None):
+        headers = {'Cookie': '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())}
+        body = None
+        if method == 'post':
+            if settings.CSRF_COOKIE_NAME in self.cookies:
+                data = {**data, 'csrfmiddlewaretoken': self.cookies[settings.CSRF_COOKIE_NAME].value}
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.connection.request(method.upper(), self.prefix + path, body, headers)
+        response = self.connection.getresponse()
+        content = response.read().decode()
+        for header in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(header)
+        for name in [name for name, morsel in self.cookies.items() if morsel['max-age'] == '0']:
+            del self.cookies[name]
+        return response.status, content
+
+    def close(self):
+        self.connection.close()
+        connections.close_all()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    # Headers and body are written separately; with Nagle on, each
+    # keep-alive response waits for the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Shopper:
+    def __init__(self, session, rng, catalog, anonymous=False):
+        self.session = session
+        self.rng = rng
+        self.catalog = catalog
+        self.mix = ANONYMOUS_TRAFFIC_MIX if anonymous else TRAFFIC_MIX
+        # Anonymous requests are reported apart, as they can hit the page cache.
+        self.suffix = ' (anonymous)' if anonymous else ''
+        self.lines = []  # watch_ids this shopper put in the cart
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    @property
+    def requests(self):
+        return sum(len(samples) for samples in self.samples.values())
+
+    def hit(self, endpoint, method, path, data=None):
+        started = time.perf_counter()
+        try:
+            status, content = self.session.request(method, path, data)
+        except (OSError, http.client.HTTPException):
+            status, content = 'connection_error', ''
+        self.samples[endpoint + self.suffix].append(time.perf_counter() - started)
+        self.statuses[endpoint + self.suffix][str(status)] += 1
+        return status, content
+
+    def act(self):
+        action = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        getattr(self, action)()
+
+    def home(self):
+        self.hit('home', 'get', '/')
+
+    def shop(self):
+        params = {'brand': self.rng.choice(self.catalog['brands']), 'price_range': self.rng.choice(list(PRICE_RANGES))}
+        if self.rng.random() < 0.3:
+            params['gender'] = self.rng.choice(self.catalog['genders'])
+        if self.rng.random() < 0.2:
+            params['page'] = self.rng.randint(2, 5)
+        self.hit('shop', 'get', '/shop/?' + urlencode(params))
+
+    def add_to_cart(self):
+        watch_id = self.rng.choice(self.catalog['watch_ids'])
+        self.hit('add_to_cart', 'get', f'/add_to_cart/{watch_id}/')
+        if watch_id not in self.lines:
+            self.lines.append(watch_id)
+
+    def cart(self):
+        self.hit('cart', 'get', '/cart/')
+
+    def update_quantity(self):
+        if not self.lines:
+            return self.add_to_cart()
+        self.hit('update_quantity', 'get', f'/update_quantity/{self.rng.choice(self.lines)}/increase/')
+
+    def remove_item(self):
+        if not self.lines:
+            return self.add_to_cart()
+        self.hit('remove_item', 'get', f'/remove_item/{self.lines.pop()}/')
+
+    def checkout(self):
+        if not self.lines:
+            return self.add_to_cart()
+        status, content = self.hit('checkout', 'get', '/checkout/')
+        key = IDEMPOTENCY_KEY_RE.search(content)
+        if status != 200 or key is None:
+            return
+        self.hit('place_order', 'post', '/place_order/', {
+            'idempotency_key': key.group(1),
+            'address': '1 Load Test Street', 'city': 'Load', 'postal_code': '00000', 'country': 'Test',
+            'payment_method': 'paypal',
+        })
+        self.lines = []
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a shop traffic mix (home, filtered shop listings, cart changes and checkouts) from "
+        "concurrent shoppers, some of them anonymous. Writes requests/sec and p50/p95/p99 latency per "
+        "endpoint as JSON, so runs can be diffed between commits. --seed-catalog first writes a "
+        "synthetic catalog from Csv files/watches.csv over watches 1..N in the configured database; "
+        "orders placed by the run are deleted and stock is restored afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed-catalog', action='store_true',
+            help="Overwrite the catalog with --watches synthetic watches first. Only for scratch databases.",
+        )
+        parser.add_argument('--watches', type=int, default=1000, help="Size of the --seed-catalog catalog.")
+        parser.add_argument('--requests', type=int, default=2000, help="Total requests across all shoppers.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent shoppers, one thread each.")
+        parser.add_argument(
+            '--anonymous', type=float, default=0.5,
+            help="Share of shoppers who are not logged in and only browse (0 to 1).",
+        )
+        parser.add_argument(
+            '--transport', choices=['client', 'http'], default='client',
+            help="'client' calls the handler through the test client; 'http' serves the WSGI app on a "
+                 "local socket with Django's threaded server and sends real HTTP requests.",
+        )
+        parser.add_argument(
+            '--url', help="Send HTTP requests to an already running server, e.g. http://127.0.0.1:8000. "
+                          "It must use the same database and session store.",
+        )
+        parser.add_argument('--seed', type=int, default=0, help="Random seed for the traffic mix.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive numbers.")
+        if not 0 <= options['anonymous'] <= 1:
+            raise CommandError("--anonymous must be between 0 and 1.")
+        if options['seed_catalog']:
+            self.seed_catalog(options['watches'])
+        catalog = {
+            'watch_ids': list(Watch.objects.values_list('watch_id', flat=True)),
+            'brands': list(Brand.objects.filter(watch__isnull=False).distinct().values_list('brand_name', flat=True)),
+            'genders': list(Gender.objects.values_list('gender_name', flat=True)),
+        }
+        if not catalog['watch_ids']:
+            raise CommandError("The catalog is empty; pass --seed-catalog to seed a synthetic one.")
+
+        anonymous = round(options['concurrency'] * options['anonymous'])
+        users = [
+            User.objects.get_or_create(username=f'loadtest-{i}', defaults={'email': f'loadtest-{i}@example.invalid'})[0]
+            for i in range(options['concurrency'] - anonymous)
+        ]
+        transport = 'http' if options['url'] else options['transport']
+        started_at = timezone.now()
+        # Checkouts hold and take stock, which is put back as it was afterwards.
+        stock = dict(Stock.objects.values_list('watch_id', 'available'))
+        last_reservation = Reservation.objects.aggregate(last=Max('pk'))['last'] or 0
+        try:
+            with ExitStack() as stack:
+                base_url = options['url']
+                if not base_url:
+                    stack.enter_context(override_settings(ALLOWED_HOSTS=['*']))
+                    if transport == 'http':
+                        base_url = stack.enter_context(self.serve())
+                started = time.perf_counter()
+                # None stands for an anonymous shopper.
+                shoppers = self.run(users + [None] * anonymous, catalog, base_url, options)
+                elapsed = time.perf_counter() - started
+        finally:
+            Order.objects.filter(user__in=users).delete()
+            OutboundEmail.objects.filter(recipients__in=[user.email for user in users]).delete()
+            self.restore_stock(stock, last_reservation)
+
+        report = self.report(shoppers, elapsed, started_at, transport, options)
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            Path(options['output']).write_text(output + '\n')
+            total = report['total']
+            self.stdout.write(
+                f"{total['count']} requests, {total['rps']} req/s, p50={total['p50_ms']}ms "
+                f"p95={total['p95_ms']}ms p99={total['p99_ms']}ms; report written to {options['output']}"
+            )
+        else:
+            self.stdout.write(output)
+
+    def seed_catalog(self, count):
+        with tempfile.TemporaryDirectory() as directory:
+            feed = write_synthetic_watches(
+                Path(settings.BASE_DIR) / 'Csv files' / 'watches.csv', Path(directory) / 'watches.csv', count,
+            )
+            call_command('import_catalog', watches=feed, stdout=StringIO())
+
+    def restore_stock(self, stock, last_reservation):
+        Reservation.objects.filter(pk__gt=last_reservation).delete()
+        changed = [
+            Stock(watch_id=watch_id, available=stock[watch_id])
+            for watch_id, available in Stock.objects.values_list('watch_id', 'available').iterator()
+            if watch_id in stock and available != stock[watch_id]
+        ]
+        Stock.objects.bulk_update(changed, ['available'], batch_size=500)
+        if changed:
+            invalidate_tags(STOCK_TAG)
+
+    @contextmanager
+    def serve(self):
+        server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            yield f'http://127.0.0.1:{server.server_address[1]}'
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def run(self, users, catalog, base_url, options):
+        shoppers = []
+        lock = threading.Lock()
+        quota, extra = divmod(options['requests'], options['concurrency'])
+
+        def worker(index, user):
+            session = HTTPSession(user, base_url) if base_url else ClientSession(user)
+            # Each shopper's actions depend only on --seed and its index.
+            shopper = Shopper(session, random.Random(f"{options['seed']}-{index}"), catalog, anonymous=user is None)
+            target = quota + (index < extra)
+            try:
+                while shopper.requests < target:
+                    shopper.act()
+            finally:
+                session.close()
+            with lock:
+                shoppers.append(shopper)
+
+        workers = [threading.Thread(target=worker, args=(i, user)) for i, user in enumerate(users)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return shoppers
+
+    def report(self, shoppers, elapsed, started_at, transport, options):
+        samples, statuses = defaultdict(list), defaultdict(Counter)
+        for shopper in shoppers:
+            for endpoint, timings in shopper.samples.items():
+                samples[endpoint].extend(timings)
+                statuses[endpoint].update(shopper.statuses[endpoint])
+
+        def stats(timings, counts):
+            return {
+                **summarize(timings),
+                'rps': round(len(timings) / elapsed, 1),
+                'errors': sum(n for status, n in counts.items() if not status.startswith(('2', '3'))),
+                'statuses': dict(counts),
+            }
+
+        return {
+            'commit': git_commit(),
+            'started_at': started_at.isoformat(),
+            'database': connection.vendor,
+            'config': {
+                'watches': Watch.objects.count(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'anonymous': options['anonymous'],
+                'transport': transport,
+                'url': options['url'],
+                'seed': options['seed'],
+            },
+            'elapsed_s': round(elapsed, 3),
+            'total': stats(
+                [sample for timings in samples.values() for sample in timings],
+                sum(statuses.values(), Counter()),
+            ),
+            'endpoints': {endpoint: stats(samples[endpoint], statuses[endpoint]) for endpoint in sorted(samples)},
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from web.reports import refresh_sales_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales summary for days with new or changed orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rebuild every day instead of only the changed ones.")
+
+    def handle(self, *args, **options):
+        days = refresh_sales_summary(full=options['full'])
+        if days:
+            self.stdout.write(f"Refreshed {len(days)} days ({days[0]} to {days[-1]}).")
+        else:
+            self.stdout.write("Sales summary is up to date.")
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from web.utils import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send emails waiting in the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help="Emails sent per connection.")
+        parser.add_argument('--max-attempts', type=int, default=5, help="Attempts before an email is marked failed.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the outbox instead of exiting.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds to wait when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(options['batch_size'], options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+            if not options['loop']:
+                break
+            # Drain full batches back to back and only sleep once caught up.
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
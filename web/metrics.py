@@ -0,0 +1,229 @@
+import logging
+import random
+import threading
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Metrics for the request being handled, or None when it was not sampled.
+_current = ContextVar('request_metrics', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: count and time every query.
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += perf_counter() - started
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f}, '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+class MetricsRegistry:
+    """Per-process totals of sampled requests, keyed by URL name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, metrics):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = {
+                    'requests': 0, 'queries': 0, 'db': 0.0, 'template': 0.0,
+                    'total': 0.0, 'buckets': [0] * len(DURATION_BUCKETS),
+                }
+            stats['requests'] += 1
+            stats['queries'] += metrics.queries
+            stats['db'] += metrics.db_time
+            stats['template'] += metrics.template_time
+            stats['total'] += metrics.total_time
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if metrics.total_time <= bound:
+                    stats['buckets'][i] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {view: {**stats, 'buckets': list(stats['buckets'])}
+                    for view, stats in self._views.items()}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4.
+        views = sorted(self.snapshot().items())
+        lines = []
+        for name, key, kind, help_text in (
+            ('web_requests_total', 'requests', 'counter', 'Sampled requests.'),
+            ('web_db_queries_total', 'queries', 'counter', 'Database queries run by sampled requests.'),
+            ('web_db_seconds_total', 'db', 'counter', 'Time spent in database queries.'),
+            ('web_template_seconds_total', 'template', 'counter', 'Time spent rendering templates.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{{view="{_label(view)}"}} {stats[key]}' for view, stats in views]
+        name = 'web_request_duration_seconds'
+        lines += [f'# HELP {name} Total time to build the response.', f'# TYPE {name} histogram']
+        for view, stats in views:
+            label = _label(view)
+            for bound, count in zip(DURATION_BUCKETS, stats['buckets'], strict=True):
+                lines.append(f'{name}_bucket{{view="{label}",le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{view="{label}",le="+Inf"}} {stats["requests"]}')
+            lines.append(f'{name}_sum{{view="{label}"}} {stats["total"]}')
+            lines.append(f'{name}_count{{view="{label}"}} {stats["requests"]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _sampled():
+    rate = settings.METRICS_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    # Unmatched paths share one label so 404 scans can't grow the registry.
+    return match.view_name if match and match.view_name else 'unresolved'
+
+
+class MetricsMiddleware:
+    """
+    Record query count, database time, template render time and total time
+    for a METRICS_SAMPLE_RATE fraction of requests. Sampled responses get a
+    Server-Timing header and are added to the /metrics totals. Requests over
+    their QUERY_BUDGETS entry are logged, or fail when QUERY_BUDGET_STRICT is
+    set. Unsampled requests only pay for the sampling check.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _sampled():
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        with self._recording(metrics):
+            response = self.get_response(request)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not _sampled():
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        with self._recording(metrics):
+            response = await self.get_response(request)
+        return self._finish(request, response, metrics)
+
+    def _recording(self, metrics):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        token = _current.set(metrics)
+        stack.callback(_current.reset, token)
+        started = perf_counter()
+
+        def stop():
+            metrics.total_time = perf_counter() - started
+        stack.callback(stop)
+        return stack
+
+    def _finish(self, request, response, metrics):
+        view = _view_name(request)
+        registry.observe(view, metrics)
+        response['Server-Timing'] = metrics.server_timing()
+        budget = settings.QUERY_BUDGETS.get(view)
+        if budget is not None and metrics.queries > budget:
+            message = f'{view} ran {metrics.queries} queries, over its budget of {budget}.'
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        started = perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_time += perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    # Times top-level renders only; {% include %} and {% extends %} happen
+    # inside them, so nothing is counted twice.
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def can_read_metrics(request):
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    return request.user.is_staff
+
+
+def metrics_view(request):
+    # View names and timings are not for the public.
+    if not can_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
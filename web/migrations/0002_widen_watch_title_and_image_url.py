@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='brand',
+            name='brand_name',
+            field=models.CharField(help_text='Name of the brand', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='gender',
+            name='gender_name',
+            field=models.CharField(help_text='Name of the gender', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='type',
+            name='type_name',
+            field=models.CharField(help_text='Name of the watch type', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='watch',
+            name='image_url',
+            field=models.URLField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='watch',
+            name='title',
+            field=models.CharField(max_length=100),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0002_widen_watch_title_and_image_url'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='brand',
+            name='brand_name',
+            field=models.CharField(help_text='Name of the brand', max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='gender',
+            name='gender_name',
+            field=models.CharField(help_text='Name of the gender', max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='type',
+            name='type_name',
+            field=models.CharField(help_text='Name of the watch type', max_length=100, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='watch',
+            index=models.Index(fields=['brand', 'gender', 'type', 'price'], name='watch_filter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='watch',
+            index=models.Index(fields=['price', 'watch_id'], name='watch_price_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:43
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from ._utils import run_on_postgresql
+
+FORWARD_SQL = [
+    """
+    CREATE FUNCTION web_watch_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('simple', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(
+                (SELECT brand_name FROM web_brand WHERE brand_id = NEW.brand_id), ''
+            )), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER web_watch_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, brand_id ON web_watch
+    FOR EACH ROW EXECUTE FUNCTION web_watch_search_vector_update()
+    """,
+    # Renaming a brand re-runs the watch trigger for that brand's watches.
+    """
+    CREATE FUNCTION web_brand_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE web_watch SET title = title WHERE brand_id = NEW.brand_id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER web_brand_search_vector_trigger
+    AFTER UPDATE OF brand_name ON web_brand
+    FOR EACH ROW EXECUTE FUNCTION web_brand_search_vector_update()
+    """,
+    "UPDATE web_watch SET title = title",
+    "CREATE INDEX watch_search_idx ON web_watch USING gin (search_vector)",
+]
+
+REVERSE_SQL = [
+    "DROP INDEX IF EXISTS watch_search_idx",
+    "DROP TRIGGER IF EXISTS web_brand_search_vector_trigger ON web_brand",
+    "DROP FUNCTION IF EXISTS web_brand_search_vector_update()",
+    "DROP TRIGGER IF EXISTS web_watch_search_vector_trigger ON web_watch",
+    "DROP FUNCTION IF EXISTS web_watch_search_vector_update()",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0004_add_outbound_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='watch',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_on_postgresql(FORWARD_SQL), run_on_postgresql(REVERSE_SQL)),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-18 10:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0007_add_sales_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchImage',
+            fields=[
+                ('watch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='image', serialize=False, to='web.watch')),
+                ('source_url', models.CharField(help_text='image_url the thumbnails were built from', max_length=255)),
+                ('content_hash', models.CharField(help_text='SHA-256 of the source image', max_length=64)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0009_add_stock_and_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, help_text='Key from the checkout form; a repeated submission returns this order', max_length=64, null=True, unique=True),
+        ),
+    ]
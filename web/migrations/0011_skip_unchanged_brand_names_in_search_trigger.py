@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from ._utils import run_on_postgresql
+
+# Only a real rename needs the brand's watches re-indexed; saving a brand with
+# the same name (as import_catalog's upserts do) must not rewrite web_watch.
+FORWARD_SQL = [
+    "DROP TRIGGER IF EXISTS web_brand_search_vector_trigger ON web_brand",
+    """
+    CREATE TRIGGER web_brand_search_vector_trigger
+    AFTER UPDATE OF brand_name ON web_brand
+    FOR EACH ROW
+    WHEN (OLD.brand_name IS DISTINCT FROM NEW.brand_name)
+    EXECUTE FUNCTION web_brand_search_vector_update()
+    """,
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS web_brand_search_vector_trigger ON web_brand",
+    """
+    CREATE TRIGGER web_brand_search_vector_trigger
+    AFTER UPDATE OF brand_name ON web_brand
+    FOR EACH ROW EXECUTE FUNCTION web_brand_search_vector_update()
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0010_add_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(FORWARD_SQL), run_on_postgresql(REVERSE_SQL)),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from ._utils import run_on_postgresql
+
+# The admin searches with istartswith, which PostgreSQL runs as
+# UPPER(column::text) LIKE 'PREFIX%'. These expression indexes match that
+# form; text_pattern_ops lets LIKE use them under any collation.
+PREFIX_INDEXES = [
+    ('brand_name_prefix_idx', 'web_brand', 'brand_name'),
+    ('watch_title_prefix_idx', 'web_watch', 'title'),
+    ('order_email_prefix_idx', 'web_order', 'email'),
+    ('user_username_prefix_idx', 'web_user', 'username'),
+    ('contact_email_prefix_idx', 'web_contact', 'email'),
+]
+
+FORWARD_SQL = [
+    f'CREATE INDEX {name} ON {table} (UPPER({column}::text) text_pattern_ops)'
+    for name, table, column in PREFIX_INDEXES
+]
+
+REVERSE_SQL = [f'DROP INDEX IF EXISTS {name}' for name, table, column in PREFIX_INDEXES]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web', '0011_skip_unchanged_brand_names_in_search_trigger'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgresql(FORWARD_SQL), run_on_postgresql(REVERSE_SQL)),
+    ]
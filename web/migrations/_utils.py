@@ -0,0 +1,12 @@
+# Shared by the migrations; the leading underscore keeps the migration loader
+# from treating this module as a migration.
+
+
+def run_on_postgresql(statements):
+    """A RunPython function executing the given SQL on PostgreSQL only."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
@@ -1,10 +1,12 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 
 # Type Model
 class Type(models.Model):
     type_id = models.AutoField(primary_key=True)
-    type_name = models.CharField(max_length=100, help_text="Name of the watch type")
+    type_name = models.CharField(max_length=100, unique=True, help_text="Name of the watch type")
 
     def __str__(self):
         return self.type_name
@@ -12,7 +14,7 @@ class Type(models.Model):
 # Brand Model
 class Brand(models.Model):
     brand_id = models.AutoField(primary_key=True)
-    brand_name = models.CharField(max_length=100, help_text="Name of the brand")
+    brand_name = models.CharField(max_length=100, unique=True, help_text="Name of the brand")
 
     def __str__(self):
         return self.brand_name
@@ -20,36 +22,62 @@ class Brand(models.Model):
 # Gender Model
 class Gender(models.Model):
     gender_id = models.AutoField(primary_key=True)
-    gender_name = models.CharField(max_length=100, help_text="Name of the gender")
+    gender_name = models.CharField(max_length=100, unique=True, help_text="Name of the gender")
 
     def __str__(self):
         return self.gender_name
 
+class WatchManager(models.Manager):
+    def get_queryset(self):
+        # search_vector is only needed in WHERE clauses, never on loaded rows.
+        return super().get_queryset().defer('search_vector')
+
+
 # Watch Model
 class Watch(models.Model):
     watch_id = models.AutoField(primary_key=True)
-    title = models.CharField(max_length=50)
+    title = models.CharField(max_length=100)
     brand = models.ForeignKey(Brand, on_delete=models.CASCADE)
-    image_url = models.URLField(max_length=100)
+    image_url = models.URLField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     gender = models.ForeignKey(Gender, on_delete=models.CASCADE)
     type = models.ForeignKey(Type, on_delete=models.CASCADE)
+    # Title and brand name, maintained by a PostgreSQL trigger and GIN indexed
+    # (migration 0005). Stays empty on other databases.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = WatchManager()
+
+    class Meta:
+        indexes = (
+            # Shop filters: any prefix of brand/gender/type plus a price range.
+            models.Index(fields=['brand', 'gender', 'type', 'price'], name='watch_filter_idx'),
+            # Price-only filters and the price sort order.
+            models.Index(fields=['price', 'watch_id'], name='watch_price_idx'),
+        )
 
     def __str__(self):
+        # Names are shown only when the related rows are already loaded,
+        # so printing a watch never runs a query.
         return (
             f"Watch: {self.title}, "
-            f"Brand: {self.brand.brand_name}, "
+            f"Brand: {self._related_label('brand', 'brand_name')}, "
             f"Price: ${self.price:.2f}, "
             f"Image URL: {self.image_url}, "
-            f"Gender: {self.gender.gender_name}, "
-            f"Type: {self.type.type_name}"
+            f"Gender: {self._related_label('gender', 'gender_name')}, "
+            f"Type: {self._related_label('type', 'type_name')}"
         )
 
+    def _related_label(self, field, name_field):
+        if self._meta.get_field(field).is_cached(self):
+            return getattr(getattr(self, field), name_field)
+        return f"#{getattr(self, f'{field}_id')}"
+
 # Contact Model
 class Contact(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
-    email = models.EmailField()
+    email = models.EmailField(db_index=True)
     message = models.TextField()
 
     def __str__(self):
@@ -65,18 +93,18 @@ class User(AbstractUser):
 
 # Order Model
 class Order(models.Model):
-    STATUS_CHOICES = [
+    STATUS_CHOICES = (
         ('Pending', 'Pending'),
         ('Paid', 'Paid'),
         ('Shipped', 'Shipped'),
         ('Delivered', 'Delivered'),
         ('Cancelled', 'Cancelled'),
-    ]
+    )
 
-    PAYMENT_METHOD_CHOICES = [
+    PAYMENT_METHOD_CHOICES = (
         ('credit_card', 'Credit Card'),
         ('paypal', 'PayPal'),
-    ]
+    )
 
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -89,6 +117,17 @@ class Order(models.Model):
     shipping_country = models.CharField(max_length=255)
     email = models.EmailField()
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
+    idempotency_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False,
+        help_text="Key from the checkout form; a repeated submission returns this order",
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(fields=['email'], name='order_email_idx'),
+            models.Index(fields=['created_at'], name='order_created_at_idx'),
+            models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        )
 
     def __str__(self):
         return f"Order #{self.id} by {self.user}"
@@ -97,9 +136,11 @@ class Order(models.Model):
         return self.order_items.all()
 
     def calculate_total(self):
-        total = sum(item.get_total_price() for item in self.get_order_items())
-        self.total_price = total
-        self.save()
+        total = self.order_items.aggregate(
+            total=models.Sum(models.F('price') * models.F('quantity'), output_field=models.DecimalField())
+        )['total']
+        self.total_price = total or 0
+        self.save(update_fields=['total_price', 'updated_at'])
 
 # OrderItem Model
 class OrderItem(models.Model):
@@ -113,3 +154,97 @@ class OrderItem(models.Model):
 
     def get_total_price(self):
         return self.price * self.quantity
+
+# Watch Image Model
+class WatchImage(models.Model):
+    watch = models.OneToOneField(Watch, primary_key=True, related_name='image', on_delete=models.CASCADE)
+    source_url = models.CharField(max_length=255, help_text="image_url the thumbnails were built from")
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the source image")
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Thumbnails for watch {self.watch_id}"
+
+# Stock Model
+class Stock(models.Model):
+    # Watches without a Stock row are not tracked and are always for sale.
+    watch = models.OneToOneField(Watch, primary_key=True, related_name='stock', on_delete=models.CASCADE)
+    available = models.PositiveIntegerField(default=0, help_text="Units not yet sold or reserved")
+
+    def __str__(self):
+        return f"{self.available} x watch {self.watch_id}"
+
+# Reservation Model
+class Reservation(models.Model):
+    session_key = models.CharField(max_length=40)
+    watch = models.ForeignKey(Watch, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=['session_key', 'watch'], name='reservation_session_watch_unique'),
+        )
+        indexes = (
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        )
+
+    def __str__(self):
+        return f"{self.quantity} x watch {self.watch_id} until {self.expires_at}"
+
+# Outbound Email Model
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.TextField(help_text="Comma separated recipient addresses")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = (
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        )
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipients} ({self.status})"
+
+    def get_recipient_list(self):
+        return [address for address in self.recipients.split(',') if address]
+
+# Daily Sales Summary Model
+class DailySales(models.Model):
+    date = models.DateField()
+    brand = models.ForeignKey(Brand, on_delete=models.SET_NULL, null=True, blank=True)
+    gender = models.ForeignKey(Gender, on_delete=models.SET_NULL, null=True, blank=True)
+    type = models.ForeignKey(Type, on_delete=models.SET_NULL, null=True, blank=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "daily sales"
+        indexes = (
+            models.Index(fields=['date'], name='daily_sales_date_idx'),
+        )
+
+    def __str__(self):
+        return f"{self.date} {self.brand} / {self.gender} / {self.type}"
+
+# Report Watermark Model
+class ReportWatermark(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
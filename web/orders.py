@@ -0,0 +1,88 @@
+import secrets
+
+from django.db import IntegrityError, transaction
+
+from .models import Order, OrderItem
+from .stock import release_reservations, take_stock
+from .utils import queue_email
+
+
+def create_order(user, cart, reservation_key=None, **fields):
+    """
+    Create an Order and its OrderItems from a Cart in one transaction. The
+    cart is repriced from the database with one query, so the order total
+    never relies on cached or client-side prices, and the items are written
+    with one bulk insert. Lines for watches that no longer exist are dropped.
+
+    Stock is taken after releasing the session's reservation, so the stock
+    row locks are held only until the commit. The confirmation email goes to
+    the outbox in the same transaction, so it is queued if and only if the
+    order commits. Raises OutOfStock, and creates nothing, if a tracked watch
+    has too few units left.
+    """
+    with transaction.atomic():
+        priced = cart.price()
+        order = Order.objects.create(user=user, total_price=priced['total'], **fields)
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order=order,
+                product_id=line['watch_id'],
+                price=line['price'],
+                quantity=line['quantity'],
+            )
+            for line in priced['lines']
+        )
+        if reservation_key:
+            release_reservations(reservation_key)
+        take_stock({line['watch_id']: line['quantity'] for line in priced['lines']})
+        queue_confirmation_email(user, order, priced['lines'])
+    return order
+
+
+def queue_confirmation_email(user, order, lines):
+    subject = f"Order Confirmation - Order #{order.id}"
+    message = "Thank you for your order!\n\nOrder Summary:\n\n"
+    message += f"Order ID: {order.id}\n"
+    message += f"Shipping Address: {order.shipping_address}\n"
+    message += f"Total Price: ${order.total_price}\n\n"
+    message += "Items in your order:\n"
+
+    for line in lines:
+        message += f"- {line['name']} (x{line['quantity']}) - ${line['total']}\n"
+
+    message += "\nThank you for shopping with us!"
+
+    queue_email(subject, message, [user.email])
+
+
+def new_idempotency_key():
+    return secrets.token_urlsafe(24)
+
+
+def find_order(user, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(idempotency_key=idempotency_key, user=user).first()
+
+
+def get_or_create_order(user, cart, idempotency_key=None, **kwargs):
+    """
+    Create the order for a checkout form submission once. A repeated submit
+    with the same idempotency key (double click, client or load balancer
+    retry) gets the original order back from an indexed lookup instead of
+    running the write path again; two submits racing each other are settled
+    by the unique constraint. Returns (order, created), or (None, False)
+    when there is no earlier order and the cart is empty.
+    """
+    order = find_order(user, idempotency_key)
+    if order is not None:
+        return order, False
+    if not cart:
+        return None, False
+    try:
+        return create_order(user, cart, idempotency_key=idempotency_key or None, **kwargs), True
+    except IntegrityError:
+        order = find_order(user, idempotency_key)
+        if order is None:
+            raise
+        return order, False
@@ -0,0 +1,135 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from .cart import CART_SESSION_KEY
+
+CATALOG_TAGS = ('watch', 'brand', 'gender', 'type')
+
+
+def _tag_key(tag):
+    return f'page-tag:{tag}'
+
+
+def get_tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+async def aget_tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = await cache.aget_many(keys)
+    for key in keys:
+        if key not in versions:
+            await cache.aadd(key, time.time_ns(), None)
+            versions[key] = await cache.aget(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tags(*tags):
+    """Drop every cached page tagged with any of the given tags."""
+    cache.set_many({_tag_key(tag): time.time_ns() for tag in tags}, None)
+
+
+def page_cache_key(request, tags, params, authenticated=None, versions=None):
+    # Only the listed GET parameters take part in the key, with empty values
+    # dropped and names sorted, so tracking parameters and parameter order do
+    # not fragment the cache.
+    query = sorted(
+        (name, value)
+        for name in params
+        for value in request.GET.getlist(name)
+        if value
+    )
+    if authenticated is None:
+        authenticated = request.user.is_authenticated
+    if versions is None:
+        versions = get_tag_versions(tags)
+    parts = [
+        request.path,
+        repr(query),
+        'auth' if authenticated else 'anon',
+        *map(str, versions),
+    ]
+    return 'page:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _cache_entry(response):
+    etag = quote_etag(hashlib.md5(response.content).hexdigest())
+    response['ETag'] = etag
+    return {'content': response.content, 'content_type': response['Content-Type'], 'etag': etag}
+
+
+def _cached_response(entry):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    return response
+
+
+def _conditional_response(request, response):
+    # Browsers revalidate on every visit and get a 304 when unchanged.
+    patch_cache_control(response, no_cache=True)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+def cache_anonymous_page(tags=(), params=()):
+    """
+    Cache the rendered page for anonymous GET requests. The key covers the
+    path, the normalized `params` and the current version of each tag, so
+    invalidate_tags() expires every page carrying a tag. Responses carry an
+    ETag and repeat requests with a matching If-None-Match get a 304.
+    Logged in users and visitors with a cart in their session are never
+    served from or stored in the cache.
+    Works on both sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                user = await request.auser()
+                if (request.method not in ('GET', 'HEAD') or user.is_authenticated
+                        or await request.session.aget(CART_SESSION_KEY)):
+                    return await view(request, *args, **kwargs)
+
+                key = page_cache_key(request, tags, params, False, await aget_tag_versions(tags))
+                entry = await cache.aget(key)
+                if entry is None:
+                    response = await view(request, *args, **kwargs)
+                    if response.status_code != 200 or response.streaming:
+                        return response
+                    await cache.aset(key, _cache_entry(response), settings.PAGE_CACHE_TIMEOUT)
+                else:
+                    response = _cached_response(entry)
+                return _conditional_response(request, response)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD') or request.user.is_authenticated
+                    or request.session.get(CART_SESSION_KEY)):
+                return view(request, *args, **kwargs)
+
+            key = page_cache_key(request, tags, params)
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                cache.set(key, _cache_entry(response), settings.PAGE_CACHE_TIMEOUT)
+            else:
+                response = _cached_response(entry)
+            return _conditional_response(request, response)
+        return wrapper
+    return decorator
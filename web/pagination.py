@@ -0,0 +1,134 @@
+import json
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'web.pagination.cursor'
+
+
+def estimate_count(queryset):
+    """
+    Row count from the PostgreSQL planner estimate instead of a COUNT(*)
+    scan. Other databases fall back to an exact count.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class ApproximateCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+
+def encode_cursor(direction, values):
+    return signing.dumps([direction, [str(value) for value in values]], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    if not token:
+        return None, None
+    try:
+        direction, values = signing.loads(token, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None, None
+    if direction not in ('next', 'previous'):
+        return None, None
+    return direction, values
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor('next', self.paginator.key_for(self.object_list[-1]))
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor('previous', self.paginator.key_for(self.object_list[0]))
+        return None
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over an ascending, unique ordering such as ('watch_id',)
+    or ('price', 'watch_id'). Pages are addressed by opaque signed cursors
+    holding the sort key of the first/last row, so every page is an index
+    range scan of per_page + 1 rows no matter how deep it is.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('watch_id',), approximate_count=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.approximate_count = approximate_count
+
+    @cached_property
+    def count(self):
+        if self.approximate_count:
+            return estimate_count(self.queryset)
+        return self.queryset.count()
+
+    def key_for(self, obj):
+        return [getattr(obj, field) for field in self.ordering]
+
+    def _seek(self, values, lookup):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            term = Q(**{f'{field}__{lookup}': values[index]})
+            for previous_field, value in zip(self.ordering[:index], values[:index], strict=True):
+                term &= Q(**{previous_field: value})
+            condition |= term
+        return condition
+
+    def get_page(self, cursor=None):
+        direction, values = decode_cursor(cursor)
+        if values is not None and len(values) != len(self.ordering):
+            direction, values = None, None
+
+        queryset = self.queryset
+        if direction == 'previous':
+            queryset = queryset.filter(self._seek(values, 'lt'))
+            queryset = queryset.order_by(*[f'-{field}' for field in self.ordering])
+        else:
+            if direction == 'next':
+                queryset = queryset.filter(self._seek(values, 'gt'))
+            queryset = queryset.order_by(*self.ordering)
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'previous':
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+        return KeysetPage(rows, self, has_next=has_more, has_previous=direction == 'next')
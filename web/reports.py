@@ -0,0 +1,104 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, OrderItem, ReportWatermark
+
+SALES_WATERMARK = 'daily_sales'
+EXCLUDED_STATUSES = ('Cancelled',)
+REPORT_DAYS = 30
+# How far behind the watermark each run looks again. Order.updated_at is set
+# when the row is saved, not when its transaction commits, so an order can
+# become visible with an updated_at older than a watermark already taken.
+WATERMARK_LAG = timedelta(minutes=5)
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def build_daily_sales(day):
+    """
+    Aggregate one day of order items by brand, gender and type. The join is
+    driven by the order created_at index, so only that day's rows are read.
+    """
+    start, end = day_bounds(day)
+    rows = (
+        OrderItem.objects
+        .filter(order__created_at__gte=start, order__created_at__lt=end)
+        .exclude(order__status__in=EXCLUDED_STATUSES)
+        .values('product__brand_id', 'product__gender_id', 'product__type_id')
+        .annotate(
+            orders=Count('order_id', distinct=True),
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity'), output_field=DecimalField()),
+        )
+        .order_by()
+    )
+    return [
+        DailySales(
+            date=day,
+            brand_id=row['product__brand_id'],
+            gender_id=row['product__gender_id'],
+            type_id=row['product__type_id'],
+            orders=row['orders'],
+            units=row['units'],
+            revenue=row['revenue'],
+        )
+        for row in rows
+    ]
+
+
+def refresh_sales_summary(full=False):
+    """
+    Rebuild the daily sales rows for every day that has an order created or
+    updated since the last run, less WATERMARK_LAG. Each day is replaced as a
+    whole, so days seen again by the overlap come out the same. Returns the
+    list of days that were rebuilt.
+    """
+    with transaction.atomic():
+        watermark, _ = ReportWatermark.objects.select_for_update().get_or_create(name=SALES_WATERMARK)
+        orders = Order.objects.all()
+        if full:
+            DailySales.objects.all().delete()
+        elif watermark.value is not None:
+            orders = orders.filter(updated_at__gt=watermark.value - WATERMARK_LAG)
+
+        high = orders.aggregate(high=Max('updated_at'))['high']
+        if high is None:
+            return []
+        days = sorted(set(
+            orders.filter(updated_at__lte=high)
+            .annotate(day=TruncDate('created_at'))
+            .values_list('day', flat=True)
+        ))
+
+        DailySales.objects.filter(date__in=days).delete()
+        for day in days:
+            DailySales.objects.bulk_create(build_daily_sales(day))
+
+        watermark.value = high if full or watermark.value is None else max(high, watermark.value)
+        watermark.save(update_fields=['value'])
+    return days
+
+
+def get_sales_dashboard(days=REPORT_DAYS):
+    """Totals for the admin dashboard, read from the summary table only."""
+    summary = DailySales.objects.filter(date__gte=timezone.localdate() - timedelta(days=days - 1))
+    totals = summary.aggregate(units=Sum('units'), revenue=Sum('revenue'))
+    by_day = summary.values('date').annotate(units=Sum('units'), revenue=Sum('revenue')).order_by('-date')
+    by_brand = (
+        summary.values('brand__brand_name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')[:10]
+    )
+    return {
+        'report_days': days,
+        'totals': totals,
+        'by_day': list(by_day),
+        'by_brand': list(by_brand),
+    }
@@ -0,0 +1,112 @@
+import re
+from bisect import bisect_left
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import Case, F, IntegerField, When
+
+from .catalog import get_catalog_version, get_lookups
+from .models import Watch
+
+# Text search configuration used by the search_vector trigger (see migration
+# 0005). 'simple' does no stemming, so prefixes of model numbers still match.
+SEARCH_CONFIG = 'simple'
+# The in-memory fallback ranks in Python and returns at most this many hits.
+FALLBACK_RESULT_LIMIT = 1000
+
+TITLE_WEIGHT = 2
+BRAND_WEIGHT = 1
+
+
+def tokenize(text):
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+class InvertedIndex:
+    """
+    Token -> {watch_id: weight} postings built from watch titles and brand
+    names. Used when the database is not PostgreSQL, e.g. SQLite test runs.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.postings = {}
+        brands = get_lookups().brands
+        rows = Watch.objects.values_list('watch_id', 'title', 'brand_id').order_by()
+        for watch_id, title, brand_id in rows.iterator(chunk_size=5000):
+            for token in tokenize(title):
+                self._add(token, watch_id, TITLE_WEIGHT)
+            brand = brands.get(brand_id)
+            if brand is not None:
+                for token in tokenize(brand.brand_name):
+                    self._add(token, watch_id, BRAND_WEIGHT)
+        self.tokens = sorted(self.postings)
+
+    def _add(self, token, watch_id, weight):
+        postings = self.postings.setdefault(token, {})
+        postings[watch_id] = max(postings.get(watch_id, 0), weight)
+
+    def _prefix_matches(self, term):
+        scores = {}
+        index = bisect_left(self.tokens, term)
+        while index < len(self.tokens) and self.tokens[index].startswith(term):
+            # Whole-word matches rank above prefix matches.
+            boost = 2 if self.tokens[index] == term else 1
+            for watch_id, weight in self.postings[self.tokens[index]].items():
+                scores[watch_id] = max(scores.get(watch_id, 0), weight * boost)
+            index += 1
+        return scores
+
+    def search(self, terms, limit=FALLBACK_RESULT_LIMIT):
+        """Watch ids matching every term as a prefix, best match first."""
+        scores = None
+        for term in terms:
+            matches = self._prefix_matches(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {watch_id: score + matches[watch_id] for watch_id, score in scores.items() if watch_id in matches}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [watch_id for watch_id, score in ranked[:limit]]
+
+
+_index = None
+
+
+def get_search_index():
+    global _index
+    version = get_catalog_version()
+    if _index is None or _index.version != version:
+        _index = InvertedIndex(version)
+    return _index
+
+
+def search_watches(watches, query):
+    """
+    Narrow a watch queryset to the ones matching every word of the query as a
+    prefix of a word in the title or brand name, ordered by relevance.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return watches.none()
+
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=SEARCH_CONFIG
+        )
+        return (
+            watches.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .order_by('-rank', 'watch_id')
+        )
+
+    watch_ids = get_search_index().search(terms)
+    if not watch_ids:
+        return watches.none()
+    position = Case(
+        *[When(watch_id=watch_id, then=index) for index, watch_id in enumerate(watch_ids)],
+        output_field=IntegerField(),
+    )
+    return watches.filter(watch_id__in=watch_ids).annotate(position=position).order_by('position')
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .page_cache import invalidate_tags
+from .models import Watch, Brand, Gender, Type, Stock
+from .stock import STOCK_TAG
+
+
+@receiver(post_save, sender=Watch)
+@receiver(post_delete, sender=Watch)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=Gender)
+@receiver(post_delete, sender=Gender)
+@receiver(post_save, sender=Type)
+@receiver(post_delete, sender=Type)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+    invalidate_tags(sender._meta.model_name)
+
+
+# Stock edited in the admin or restocked through the ORM. Checkouts change
+# stock with queryset updates and invalidate the tag themselves.
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+def stock_changed(sender, **kwargs):
+    invalidate_tags(STOCK_TAG)
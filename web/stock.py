@@ -0,0 +1,133 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from .models import Reservation, Stock
+from .page_cache import invalidate_tags
+
+STOCK_TAG = 'stock'
+
+
+class OutOfStock(Exception):
+    def __init__(self, watch_ids):
+        super().__init__(f"Not enough stock for watch {', '.join(map(str, watch_ids))}.")
+        self.watch_ids = watch_ids
+
+
+def in_stock(watches):
+    return watches.filter(Q(stock__isnull=True) | Q(stock__available__gt=0))
+
+
+def _locked_stock(watch_ids):
+    # A fixed lock order keeps two multi-line checkouts from deadlocking.
+    return dict(
+        Stock.objects.select_for_update().filter(watch_id__in=watch_ids)
+        .order_by('watch_id').values_list('watch_id', 'available')
+    )
+
+
+def _by_watch(quantities):
+    return Case(
+        *[When(watch_id=watch_id, then=Value(quantity)) for watch_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def take_stock(quantities):
+    """
+    Take {watch_id: quantity} units inside the caller's transaction and return
+    the ids of the tracked watches. The stock rows are locked, checked and
+    decremented by one UPDATE, so concurrent buyers of the last unit queue on
+    the row lock and only one succeeds, and a checkout runs the same two
+    queries whatever the size of the cart. Raises OutOfStock, rolling the
+    transaction back, if any line is short.
+    """
+    available = _locked_stock(quantities)
+    short = [watch_id for watch_id, units in available.items() if units < quantities[watch_id]]
+    if short:
+        raise OutOfStock(short)
+    taken = {watch_id: quantities[watch_id] for watch_id in available}
+    if taken:
+        Stock.objects.filter(watch_id__in=taken).update(available=F('available') - _by_watch(taken))
+    if any(available[watch_id] == quantity for watch_id, quantity in taken.items()):
+        transaction.on_commit(lambda: invalidate_tags(STOCK_TAG))
+    return list(taken)
+
+
+def put_back(quantities):
+    tracked = {watch_id: quantities[watch_id] for watch_id in _locked_stock(quantities)}
+    if tracked:
+        Stock.objects.filter(watch_id__in=tracked).update(available=F('available') + _by_watch(tracked))
+
+
+def release_reservations(session_key):
+    """Return a session's held units to stock, inside the caller's transaction."""
+    # Locking the rows first means the sweeper, which skips locked rows,
+    # can never return the same reservation a second time.
+    reservations = list(Reservation.objects.select_for_update().filter(session_key=session_key))
+    put_back({reservation.watch_id: reservation.quantity for reservation in reservations})
+    Reservation.objects.filter(pk__in=[reservation.pk for reservation in reservations]).delete()
+
+
+def reserve(session_key, quantities):
+    """
+    Hold up to STOCK_RESERVATION_MAX_QUANTITY units of each cart line for
+    STOCK_RESERVATION_TIMEOUT. A hold is never extended: reloading checkout
+    with the same cart keeps it as it is, and a changed cart is held until
+    the earlier hold's expiry. Placing the order takes the full quantities.
+    """
+    now = timezone.now()
+    wanted = {
+        watch_id: min(quantity, settings.STOCK_RESERVATION_MAX_QUANTITY)
+        for watch_id, quantity in quantities.items()
+    }
+    reservations = list(Reservation.objects.filter(session_key=session_key))
+    held = {reservation.watch_id: reservation.quantity for reservation in reservations}
+    live = reservations and all(reservation.expires_at > now for reservation in reservations)
+    if live and all(wanted.get(watch_id) == quantity for watch_id, quantity in held.items()):
+        # Lines without a hold are fine as long as they are not tracked.
+        unheld = wanted.keys() - held.keys()
+        if not unheld or not Stock.objects.filter(watch_id__in=unheld).exists():
+            return
+    if live:
+        expires_at = min(reservation.expires_at for reservation in reservations)
+    else:
+        expires_at = now + timedelta(seconds=settings.STOCK_RESERVATION_TIMEOUT)
+    with transaction.atomic():
+        if reservations:
+            release_reservations(session_key)
+        Reservation.objects.bulk_create(
+            Reservation(session_key=session_key, watch_id=watch_id, quantity=wanted[watch_id], expires_at=expires_at)
+            for watch_id in take_stock(wanted)
+        )
+
+
+def release_expired_reservations(batch_size=500):
+    """
+    Return expired reservations to stock in batches. Rows locked by a
+    checkout in progress are skipped (SKIP LOCKED), so several sweepers
+    and checkouts never wait on each other.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Reservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=timezone.now())
+                .order_by('expires_at')[:batch_size]
+            )
+            if not batch:
+                break
+            quantities = defaultdict(int)
+            for reservation in batch:
+                quantities[reservation.watch_id] += reservation.quantity
+            put_back(quantities)
+            Reservation.objects.filter(pk__in=[reservation.pk for reservation in batch]).delete()
+        released += len(batch)
+    if released:
+        invalidate_tags(STOCK_TAG)
+    return released
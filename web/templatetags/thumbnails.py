@@ -0,0 +1,28 @@
+from django import template
+from django.conf import settings
+from django.urls import reverse
+from django.utils.html import format_html
+
+from web import images
+
+register = template.Library()
+
+
+@register.filter
+def image_version(watch):
+    return images.image_version(watch)
+
+
+@register.simple_tag
+def thumbnail_attrs(watch_id, version=None, sizes='(min-width: 768px) 270px, 100vw'):
+    """
+    src, srcset and sizes attributes for a watch image's thumbnails. Without
+    a version (thumbnails not built yet) the URLs are only cached briefly.
+    """
+    query = f'?v={version}' if version else ''
+    urls = [
+        (f"{reverse('watch_thumbnail', args=[watch_id, width])}{query}", width)
+        for width in settings.THUMBNAIL_WIDTHS
+    ]
+    srcset = ', '.join(f'{url} {width}w' for url, width in urls)
+    return format_html('src="{}" srcset="{}" sizes="{}"', urls[len(urls) // 2][0], srcset, sizes)
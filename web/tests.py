@@ -1,3 +1,981 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from itertools import product
+from pathlib import Path
+from unittest import mock, skipIf
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature, tag
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from . import async_views, views
+from .bench import write_synthetic_watches
+from .cart import CART_SESSION_KEY, MAX_CART_OPERATIONS, Cart, encode_items
+from .catalog import FILTER_PARAMS, PRICE_RANGES, filter_watches, get_catalog_version, get_facets, get_featured_watches, get_lookups
+from .images import build_thumbnails, fetch_image, image_version, source_version, thumbnail_path
+from .metrics import QueryBudgetExceeded, registry
+from .orders import create_order
+from .models import Watch, Brand, Gender, Type, OutboundEmail, Order, OrderItem, DailySales, Reservation, Stock, User
+from .search import InvertedIndex, tokenize
+from .reports import WATERMARK_LAG, refresh_sales_summary
+from .pagination import CURSOR_SALT, ApproximateCountPaginator
+from .page_cache import get_tag_versions, invalidate_tags
+from .stock import STOCK_TAG, OutOfStock, release_expired_reservations, reserve, take_stock
+from .urls import build_urlpatterns
+from .utils import queue_email, send_queued_emails
+
+# Views render {% static %} tags; the manifest storage in settings needs a
+# collectstatic run first, which the tests should not depend on.
+TEST_STORAGES = {
+    **settings.STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+def create_watch(title='Watch', brand='Titan', gender='Women', watch_type='Analog',
+                 image_url='https://example.com/watch.jpg', price=100):
+    """A watch with get-or-created brand, gender and type rows."""
+    return Watch.objects.create(
+        title=title,
+        brand=Brand.objects.get_or_create(brand_name=brand)[0],
+        gender=Gender.objects.get_or_create(gender_name=gender)[0],
+        type=Type.objects.get_or_create(type_name=watch_type)[0],
+        image_url=image_url,
+        price=price,
+    )
+
+
+class WatchFilterIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(brand_name='Titan')
+        gender = Gender.objects.create(gender_name='Women')
+        watch_type = Type.objects.create(type_name='Analog')
+        Watch.objects.bulk_create(
+            Watch(
+                title=f'Watch {number}',
+                brand=brand,
+                gender=gender,
+                type=watch_type,
+                image_url='https://example.com/watch.jpg',
+                price=number * 10,
+            )
+            for number in range(1, 101)
+        )
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            # The test tables are tiny, so stop the planner preferring a
+            # sequential scan over an index that is usable.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, plan, filters):
+        if connection.vendor == 'postgresql':
+            self.assertIn('Index', plan, f"{filters} does not use an index:\n{plan}")
+            self.assertNotIn('Seq Scan on web_watch', plan, f"{filters} scans web_watch:\n{plan}")
+        else:
+            self.assertIn('USING', plan, f"{filters} does not use an index:\n{plan}")
+            self.assertNotRegex(plan, r'SCAN web_watch(?! USING)', f"{filters} scans web_watch:\n{plan}")
+
+    def test_every_filter_combination_uses_an_index(self):
+        combinations = product(
+            [None, 'Titan'],
+            [None, 'Women'],
+            [None, 'Analog'],
+            [None, *PRICE_RANGES],
+        )
+        for brand, gender, watch_type, price_range in combinations:
+            filters = {'brand': brand, 'gender': gender, 'type': watch_type, 'price_range': price_range}
+            if not any(filters.values()):
+                continue
+            with self.subTest(**filters):
+                plan = self.explain(filter_watches(filters))
+                self.assertUsesIndex(plan, filters)
+
+    def test_unknown_name_matches_nothing(self):
+        filters = {'brand': 'Unknown', 'gender': None, 'type': None, 'price_range': None}
+        get_lookups()
+        with self.assertNumQueries(0):
+            self.assertFalse(filter_watches(filters).exists())
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        combinations = product(['Titan', 'Fossil'], ['Women', 'Men'], ['Analog', 'Digital'])
+        for number, (brand, gender, watch_type) in enumerate(combinations):
+            for price in (40 + number * 20, 150, 600 if number % 2 else 180):
+                create_watch(f'Watch {number}', brand, gender, watch_type, price=price)
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self, facets, key):
+        return {option['name']: option['count'] for option in facets[key]}
+
+    def test_each_facet_counts_every_other_filter(self):
+        filters = {'brand': 'Titan', 'gender': 'Women', 'type': None, 'price_range': '101-200'}
+        facets = get_facets(filters)
+        for facet, key in [('brand', 'brands'), ('gender', 'genders'), ('type', 'types'), ('price_range', 'price_ranges')]:
+            with self.subTest(facet=facet):
+                expected = {name: filter_watches({**filters, facet: name}).count() for name in self.counts(facets, key)}
+                self.assertEqual(self.counts(facets, key), expected)
+        self.assertEqual(self.counts(facets, 'price_ranges'), {'0-50': 1, '51-100': 1, '101-200': 3, '201-500': 0, '500+': 1})
+        # Other combinations are summed from the cached cube.
+        with self.assertNumQueries(0):
+            get_facets({**filters, 'type': 'Digital'})
+
+    def test_counts_change_with_the_catalog_version(self):
+        filters = {'brand': 'Titan', 'gender': None, 'type': None, 'price_range': None}
+        before = get_facets(filters)
+        version = get_catalog_version()
+        create_watch('New', 'Titan', 'Men', 'Digital', price=150)
+        self.assertGreater(get_catalog_version(), version)
+        after = get_facets(filters)
+        self.assertEqual(self.counts(after, 'brands')['Titan'], self.counts(before, 'brands')['Titan'] + 1)
+        self.assertEqual(self.counts(after, 'price_ranges')['101-200'], self.counts(before, 'price_ranges')['101-200'] + 1)
+        self.assertEqual(self.counts(after, 'brands')['Fossil'], self.counts(before, 'brands')['Fossil'])
+
+
+@override_settings(STORAGES=TEST_STORAGES, SHOP_PAGINATION='keyset')
+class ShopPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Repeated prices, so cursors have to break ties on watch_id.
+        for number in range(20):
+            create_watch(f'Watch {number}', price=100 + number % 4 * 10)
+        cls.by_price = list(Watch.objects.order_by('price', 'watch_id').values_list('watch_id', flat=True))
+
+    def page(self, **params):
+        # Pages are fetched again below, so skip the page cache.
+        cache.clear()
+        return self.client.get('/shop/', {'sort': 'price', **params}).context['watches']
+
+    def test_cursors_walk_forwards_and_back(self):
+        pages = [self.page()]
+        while pages[-1].has_next():
+            pages.append(self.page(cursor=pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [9, 9, 2])
+        self.assertEqual([watch.watch_id for page in pages for watch in page], self.by_price)
+        self.assertFalse(pages[0].has_previous())
+
+        previous = self.page(cursor=pages[-1].previous_cursor)
+        self.assertEqual([watch.watch_id for watch in previous], self.by_price[9:18])
+        previous = self.page(cursor=previous.previous_cursor)
+        self.assertEqual([watch.watch_id for watch in previous], self.by_price[:9])
+        self.assertFalse(previous.has_previous())
+
+    def test_tampered_cursor_starts_over(self):
+        cursor = self.page().next_cursor
+        first_page = [watch.watch_id for watch in self.page()]
+        for tampered in [cursor[:-2] + 'xx', signing.dumps(['next', ['100']], salt=CURSOR_SALT), 'garbage']:
+            with self.subTest(cursor=tampered):
+                self.assertEqual([watch.watch_id for watch in self.page(cursor=tampered)], first_page)
+
+    @skipIf(connection.vendor == 'postgresql', 'PostgreSQL counts are planner estimates.')
+    @override_settings(SHOP_APPROXIMATE_COUNT=True)
+    def test_approximate_count_falls_back_to_an_exact_count(self):
+        for pagination in ('keyset', 'offset'):
+            with self.subTest(pagination=pagination), override_settings(SHOP_PAGINATION=pagination):
+                self.assertEqual(self.page(price_range='101-200').paginator.count, 15)
+        paginator = ApproximateCountPaginator(Watch.objects.order_by('watch_id'), 9)
+        self.assertEqual((paginator.count, paginator.num_pages), (20, 3))
+
+
+class AdminSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for brand, title in [('Allen Solly', 'Classic Analog'), ('Titan', 'Allen Key Chrono'), ('Titan', 'Neo')]:
+            create_watch(title, brand)
+
+    def search(self, query):
+        request = RequestFactory().get('/admin/web/watch/', {'q': query})
+        queryset, _ = admin.site._registry[Watch].get_search_results(request, Watch.objects.all(), query)
+        return sorted(queryset.values_list('title', flat=True))
+
+    def test_query_is_matched_as_one_prefix_of_title_or_brand(self):
+        self.assertEqual(self.search('allen solly'), ['Classic Analog'])
+        self.assertEqual(self.search('Allen'), ['Allen Key Chrono', 'Classic Analog'])
+        self.assertEqual(self.search('Solly'), [])
+        self.assertEqual(self.search('"neo"'), ['Neo'])
+
+    def test_numeric_query_searches_ids_and_titles(self):
+        numbered = create_watch('1000', 'Titan')
+        self.assertEqual(self.search('1000'), ['1000'])
+        self.assertEqual(self.search(str(numbered.watch_id)), ['1000'])
+
+    def test_id_only_admins_have_a_search_box(self):
+        watch = create_watch('Neo', 'Titan')
+        Stock.objects.create(watch=watch, available=3)
+        stock_admin = admin.site._registry[Stock]
+        request = RequestFactory().get('/admin/web/stock/')
+        self.assertEqual(stock_admin.get_search_fields(request), ('watch__watch_id__exact',))
+        queryset, _ = stock_admin.get_search_results(request, Stock.objects.all(), str(watch.watch_id))
+        self.assertEqual(list(queryset.values_list('watch_id', flat=True)), [watch.watch_id])
+        queryset, _ = stock_admin.get_search_results(request, Stock.objects.all(), 'neo')
+        self.assertFalse(queryset.exists())
+
+
+class WatchAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        brand = Brand.objects.create(brand_name='Titan')
+        gender = Gender.objects.create(gender_name='Women')
+        watch_type = Type.objects.create(type_name='Analog')
+        Watch.objects.bulk_create(
+            Watch(
+                title=f'Watch {number}',
+                brand=brand,
+                gender=gender,
+                type=watch_type,
+                image_url='https://example.com/watch.jpg',
+                # Repeated prices, so pages have to break ties on watch_id.
+                price=100 + number % 3 * 10,
+            )
+            for number in range(7)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sparse_fields(self):
+        response = self.client.get('/api/watches/', {'fields': 'title,price,brand'})
+        self.assertEqual(response.status_code, 200)
+        for watch in response.json()['results']:
+            self.assertEqual(set(watch), {'watch_id', 'title', 'price', 'brand'})
+            self.assertEqual(watch['brand'], 'Titan')
+
+    def test_unknown_field_is_a_bad_request(self):
+        response = self.client.get('/api/watches/', {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+
+    def test_next_links_walk_every_watch_once(self):
+        url = '/api/watches/?' + urlencode({'sort': 'price', 'limit': 2, 'fields': 'price'})
+        seen = []
+        while url:
+            self.assertIn('sort=price', url)
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen += [(watch['price'], watch['watch_id']) for watch in page['results']]
+            url = page['next']
+        expected = sorted(Watch.objects.values_list('price', 'watch_id'))
+        self.assertEqual([(float(price), watch_id) for price, watch_id in seen],
+                         [(float(price), watch_id) for price, watch_id in expected])
+
+    def test_unchanged_catalog_is_not_modified(self):
+        response = self.client.get('/api/watches/')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/watches/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_watch('Chrono Sport', 'Titan', price=150)
+        create_watch('Chronograph Classic', 'Fossil', price=300)
+        create_watch('Diver', 'Chrono Works', price=150)
+        create_watch('Classic Sport', 'Titan', price=80)
+        for number in range(11):
+            create_watch(f'Sport {number}', 'Titan', price=120)
+
+    def setUp(self):
+        cache.clear()
+
+    def index_search(self, query):
+        titles = dict(Watch.objects.values_list('watch_id', 'title'))
+        return [titles[watch_id] for watch_id in InvertedIndex(version=0).search(tokenize(query))]
+
+    def test_every_term_must_match_a_word_prefix(self):
+        self.assertEqual(self.index_search('chron spo'), ['Chrono Sport'])
+        self.assertEqual(self.index_search('classic chronog'), ['Chronograph Classic'])
+        self.assertEqual(self.index_search('hrono'), [])
+        self.assertEqual(self.index_search('chrono rolex'), [])
+
+    def test_whole_words_and_titles_rank_first(self):
+        # Whole title word, then title prefix and whole brand word (tied, so
+        # by watch_id).
+        self.assertEqual(self.index_search('chrono'), ['Chrono Sport', 'Chronograph Classic', 'Diver'])
+
+    def test_search_is_combined_with_filters_and_paginated(self):
+        params = {'q': 'sport', 'brand': 'Titan', 'price_range': '101-200'}
+        first = self.client.get('/search/', params).context['watches']
+        second = self.client.get('/search/', {**params, 'page': 2}).context['watches']
+        self.assertEqual(first.paginator.count, 12)
+        self.assertEqual(len(first), 9)
+        titles = [watch.title for watch in [*first, *second]]
+        self.assertEqual(len(set(titles)), 12)
+        self.assertNotIn('Classic Sport', titles)
+
+    def test_suggestions(self):
+        response = self.client.get('/search/suggest/', {'q': 'sport'})
+        suggestions = response.json()['suggestions']
+        self.assertEqual(len(suggestions), 8)
+        self.assertEqual(set(suggestions[0]), {'watch_id', 'title'})
+        self.assertEqual(self.client.get('/search/suggest/', {'q': ' '}).json(), {'suggestions': []})
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.watch = create_watch('Neo')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertRendered(self, response, rendered=True):
+        # A page served from the cache is not rendered, so it has no context.
+        self.assertEqual(response.context is not None, rendered)
+
+    def test_repeat_anonymous_visits_are_served_from_the_cache(self):
+        first = self.client.get('/')
+        self.assertRendered(first)
+        second = self.client.get('/', {'utm_source': 'mail'})
+        self.assertRendered(second, False)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_gets_not_modified(self):
+        etag = self.client.get('/')['ETag']
+        response = self.client.get('/', headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get('/', headers={'if-none-match': '"stale"'}).status_code, 200)
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get('/')
+        self.client.force_login(self.user)
+        self.assertRendered(self.client.get('/'))
+
+    def test_visitors_with_a_cart_bypass_the_cache(self):
+        self.client.get('/')
+        session = self.client.session
+        session[CART_SESSION_KEY] = encode_items({str(self.watch.watch_id): 1})
+        session.save()
+        self.assertRendered(self.client.get('/'))
+        self.assertRendered(self.client.get('/'))
+
+    def test_invalidated_tags_drop_the_page(self):
+        self.client.get('/')
+        invalidate_tags('brand')
+        self.assertRendered(self.client.get('/'))
+        self.assertRendered(self.client.get('/'), False)
+        self.watch.title = 'Neo Sport'
+        self.watch.save()
+        self.assertContains(self.client.get('/'), 'Neo Sport')
+
+
+class AsyncURLConf:
+    urlpatterns = build_urlpatterns(async_views)
+
+
+@override_settings(ROOT_URLCONF=AsyncURLConf, STORAGES=TEST_STORAGES)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.watches = [create_watch(f'Watch {number}', price=100 + number) for number in range(12)]
+
+    def setUp(self):
+        cache.clear()
+
+    async def fill_cart(self, items):
+        session = await self.async_client.asession()
+        await session.aset(CART_SESSION_KEY, encode_items(items))
+        await session.asave()
+
+    async def cart_items(self):
+        lines = (await self.async_client.get('/api/cart/')).json()['lines']
+        return {line['watch_id']: line['quantity'] for line in lines}
+
+    async def test_index_is_cached_for_anonymous_visitors(self):
+        first = await self.async_client.get('/')
+        self.assertEqual([watch.title for watch in first.context['watches']][:2], ['Watch 11', 'Watch 10'])
+        # A page served from the cache is not rendered, so it has no context.
+        second = await self.async_client.get('/')
+        self.assertIsNone(second.context)
+        self.assertEqual(second.content, first.content)
+        response = await self.async_client.get('/', headers={'if-none-match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_logged_in_users_bypass_the_page_cache(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get('/')
+        self.assertIsNotNone((await self.async_client.get('/')).context)
+
+    async def test_visitors_with_a_cart_bypass_the_page_cache(self):
+        await self.async_client.get('/')
+        await self.fill_cart({str(self.watches[0].watch_id): 1})
+        self.assertIsNotNone((await self.async_client.get('/')).context)
+
+    async def test_shop_pages_and_search(self):
+        page = (await self.async_client.get('/shop/', {'page': 2})).context['watches']
+        self.assertEqual(page.paginator.count, 12)
+        self.assertEqual([watch.title for watch in page], ['Watch 9', 'Watch 10', 'Watch 11'])
+        results = (await self.async_client.get('/search/', {'q': 'watch 11'})).context['watches']
+        self.assertEqual([watch.title for watch in results], ['Watch 11'])
+
+    async def test_cart_view_prices_the_session_cart(self):
+        await self.fill_cart({str(self.watches[1].watch_id): 2})
+        response = await self.async_client.get('/cart/')
+        self.assertEqual(response.context['total_price'], Decimal('202.00'))
+
+    async def test_cart_api_adds_for_logged_in_users_only(self):
+        body = json.dumps({'op': 'add', 'watch_id': self.watches[0].watch_id, 'quantity': 2})
+        response = await self.async_client.post('/api/cart/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post('/api/cart/', body, content_type='application/json')
+        self.assertEqual(response.json()['count'], 2)
+        body = json.dumps({'op': 'add', 'watch_id': 0})
+        response = await self.async_client.post('/api/cart/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(await self.cart_items(), {self.watches[0].watch_id: 2})
+
+    async def test_update_quantity_and_remove_item(self):
+        watch_id = self.watches[0].watch_id
+        await self.fill_cart({str(watch_id): 1})
+        response = await self.async_client.get(f'/update_quantity/{watch_id}/increase/')
+        self.assertRedirects(response, '/cart/', fetch_redirect_response=False)
+        self.assertEqual(await self.cart_items(), {watch_id: 2})
+        await self.async_client.get(f'/update_quantity/{watch_id}/decrease/')
+        self.assertEqual(await self.cart_items(), {watch_id: 1})
+        response = await self.async_client.get('/update_quantity/0/increase/')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(f'/remove_item/{watch_id}/')
+        self.assertRedirects(response, '/cart/', fetch_redirect_response=False)
+        self.assertEqual(await self.cart_items(), {})
+
+
+class CartAPITests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.neo, cls.classic = create_watch('Neo', price=100), create_watch('Classic', price=250)
+
+    def setUp(self):
+        cache.clear()
+
+    def post(self, data):
+        body = data if isinstance(data, str) else json.dumps(data)
+        return self.client.post('/api/cart/', body, content_type='application/json')
+
+    def cart(self):
+        return {line['watch_id']: line['quantity'] for line in self.client.get('/api/cart/').json()['lines']}
+
+    def test_adding_needs_a_login(self):
+        response = self.post({'op': 'add', 'watch_id': self.neo.watch_id})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.cart(), {})
+
+    def test_unknown_watch_is_not_found(self):
+        self.client.force_login(self.user)
+        response = self.post({'op': 'add', 'watch_id': self.classic.watch_id + 1000})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.cart(), {})
+
+    def test_changing_a_line_not_in_the_cart_is_not_found(self):
+        self.client.force_login(self.user)
+        self.post({'op': 'add', 'watch_id': self.neo.watch_id})
+        for operation in ({'op': 'set', 'watch_id': self.classic.watch_id, 'quantity': 2},
+                          {'op': 'remove', 'watch_id': self.classic.watch_id}):
+            with self.subTest(op=operation['op']):
+                response = self.post(operation)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json(), {'error': 'Item not in cart.'})
+        self.assertEqual(self.cart(), {self.neo.watch_id: 1})
+
+    def test_batch_is_applied_all_or_nothing(self):
+        self.client.force_login(self.user)
+        self.post({'op': 'add', 'watch_id': self.neo.watch_id, 'quantity': 2})
+        batches = [
+            [{'op': 'add', 'watch_id': self.classic.watch_id}, {'op': 'remove', 'watch_id': self.classic.watch_id + 1000}],
+            [{'op': 'set', 'watch_id': self.neo.watch_id, 'quantity': 5}, {'op': 'add', 'watch_id': self.classic.watch_id, 'quantity': -1}],
+            [{'op': 'clear'}, {'op': 'add', 'watch_id': 'neo'}],
+        ]
+        for operations in batches:
+            with self.subTest(operations=operations):
+                self.assertIn(self.post({'ops': operations}).status_code, (400, 404))
+                self.assertEqual(self.cart(), {self.neo.watch_id: 2})
+        self.assertEqual(self.post('{"ops": [').status_code, 400)
+
+        response = self.post({'ops': [{'op': 'set', 'watch_id': self.neo.watch_id, 'quantity': 1},
+                                      {'op': 'add', 'watch_id': self.classic.watch_id}]})
+        self.assertEqual(response.json()['total'], '350.00')
+        self.assertEqual(self.cart(), {self.neo.watch_id: 1, self.classic.watch_id: 1})
+
+
+class HealthCheckTests(TestCase):
+    def setUp(self):
+        status = mock.patch.dict(views._db_status, {'checked_at': None, 'ok': False})
+        status.start()
+        self.addCleanup(status.stop)
+
+    def test_liveness_never_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthz/')
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_readiness_fails_without_a_database(self):
+        with mock.patch('web.views.connection') as broken:
+            broken.cursor.side_effect = DatabaseError
+            response = self.client.get('/readyz/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['database'], 'unreachable')
+
+    def test_readiness_check_is_reused_for_a_few_seconds(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/readyz/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/readyz/').status_code, 200)
+        views._db_status['checked_at'] -= views.DB_STATUS_TTL + 1
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/readyz/').status_code, 200)
+
+
+class FeaturedWatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(5):
+            create_watch(f'Watch {number}', brand='Titan' if number % 2 else 'Fossil')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_newest_watches_with_their_lookups(self):
+        get_lookups()
+        with self.assertNumQueries(1):
+            watches = get_featured_watches(count=3)
+            self.assertEqual([(watch.title, watch.brand.brand_name) for watch in watches],
+                             [('Watch 4', 'Fossil'), ('Watch 3', 'Titan'), ('Watch 2', 'Fossil')])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_featured_watches(count=3), watches)
+
+    def test_new_watches_are_featured_straight_away(self):
+        get_featured_watches(count=3)
+        create_watch('Watch 5')
+        self.assertEqual([watch.title for watch in get_featured_watches(count=3)], ['Watch 5', 'Watch 4', 'Watch 3'])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class OutboundEmailTests(TestCase):
+    def test_queued_emails_are_sent_in_one_batch(self):
+        for number in range(3):
+            queue_email(f'Order {number}', 'Thanks', ['customer@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_queued_emails(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+    def test_failed_email_is_retried_later(self):
+        email = queue_email('Order', 'Thanks', ['customer@example.com'])
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            self.assertEqual(send_queued_emails(max_attempts=2), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'SMTP down'))
+        self.assertGreater(email.next_attempt_at, email.created_at)
+        # Not due yet.
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=email.created_at)
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            send_queued_emails(max_attempts=2)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+
+    def test_unreachable_server_counts_as_a_failed_attempt(self):
+        emails = [queue_email('Order', 'Thanks', [f'customer{n}@example.com']) for n in range(2)]
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.open', side_effect=ConnectionRefusedError('SMTP down'),
+        ):
+            self.assertEqual(send_queued_emails(), (0, 2))
+        for email in emails:
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'SMTP down'))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # A local file stands in for the CDN image.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root = Path(directory.name)
+        source = root / 'source.png'
+        Image.new('RGB', (612, 612), 'navy').save(source)
+
+        settings_override = override_settings(
+            MEDIA_ROOT=str(root / 'media'), IMAGE_FETCH_SCHEMES=['file'], THUMBNAIL_WIDTHS=[160, 320],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.watch = create_watch(image_url=source.as_uri())
+
+    def test_thumbnails_are_resized_and_content_hashed(self):
+        record = build_thumbnails(self.watch)
+        for width in (160, 320):
+            path = thumbnail_path(record.content_hash, width)
+            self.assertIn(record.content_hash, path.name)
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (width, width))
+
+    def test_view_builds_on_demand_with_long_cache_headers(self):
+        response = self.client.get(f'/images/watch/{self.watch.watch_id}/320/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(self.watch.image.source_url, self.watch.image_url)
+
+        response = self.client.get(
+            f'/images/watch/{self.watch.watch_id}/320/', {'v': source_version(self.watch.image)},
+        )
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get(f'/images/watch/{self.watch.watch_id}/999/').status_code, 404)
+
+    def test_unreachable_source_falls_back_to_original(self):
+        Watch.objects.filter(pk=self.watch.pk).update(image_url='https://example.com/watch.jpg')
+        with mock.patch('web.images.fetch_image', wraps=fetch_image) as fetch:
+            for width in (160, 320):
+                response = self.client.get(f'/images/watch/{self.watch.watch_id}/{width}/')
+                self.assertRedirects(response, 'https://example.com/watch.jpg', fetch_redirect_response=False)
+        # The failure is remembered, so the second request does not fetch again.
+        self.assertEqual(fetch.call_count, 1)
+
+    def test_version_is_the_source_content_hash(self):
+        record = build_thumbnails(self.watch)
+        watch = Watch.objects.select_related('image').get(pk=self.watch.pk)
+        self.assertEqual(image_version(watch), record.content_hash[:12])
+
+        watch.image_url = 'https://example.com/new.jpg'
+        self.assertIsNone(image_version(watch))
+        watch = Watch.objects.get(pk=self.watch.pk)
+        with self.assertNumQueries(0):
+            self.assertIsNone(image_version(watch))
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_cached_shop_cards_pick_up_new_thumbnails(self):
+        # Logged in, so the page itself is not cached, only its fragments.
+        self.client.force_login(User.objects.create_user('shopper', 'shopper@example.com', 'password'))
+        self.assertNotContains(self.client.get('/shop/'), '?v=')
+        record = build_thumbnails(self.watch)
+        self.assertContains(self.client.get('/shop/'), f'?v={source_version(record)}')
+
+
+class StockTests(TestCase):
+    def setUp(self):
+        self.watch = create_watch()
+        Stock.objects.create(watch=self.watch, available=2)
+
+    def test_cannot_take_more_than_available(self):
+        take_stock({self.watch.pk: 2})
+        with self.assertRaises(OutOfStock):
+            take_stock({self.watch.pk: 1})
+        self.assertEqual(Stock.objects.get(watch=self.watch).available, 0)
+
+    def test_expired_reservations_return_to_stock(self):
+        reserve('session', {self.watch.pk: 2})
+        self.assertEqual(Stock.objects.get(watch=self.watch).available, 0)
+        Reservation.objects.update(expires_at=Reservation.objects.get().expires_at.replace(year=2000))
+        self.assertEqual(release_expired_reservations(), 1)
+        self.assertEqual(Stock.objects.get(watch=self.watch).available, 2)
+
+    @override_settings(STOCK_RESERVATION_MAX_QUANTITY=1)
+    def test_reservations_are_capped_and_not_renewed(self):
+        reserve('session', {self.watch.pk: 2})
+        hold = Reservation.objects.get()
+        self.assertEqual(hold.quantity, 1)
+        self.assertEqual(Stock.objects.get(watch=self.watch).available, 1)
+
+        with self.assertNumQueries(1):
+            reserve('session', {self.watch.pk: 2})
+        reserve('session', {self.watch.pk: 1, self.watch.pk + 1: 1})
+        self.assertEqual(Reservation.objects.get().expires_at, hold.expires_at)
+
+    def test_saving_stock_invalidates_stock_pages(self):
+        versions = get_tag_versions([STOCK_TAG])
+        Stock.objects.filter(watch=self.watch).get().save()
+        self.assertNotEqual(get_tag_versions([STOCK_TAG]), versions)
+
+    def test_short_line_takes_nothing_from_the_other_lines(self):
+        other = create_watch('Other')
+        Stock.objects.create(watch=other, available=5)
+        with self.assertRaises(OutOfStock) as raised:
+            take_stock({other.pk: 1, self.watch.pk: 3})
+        self.assertEqual(raised.exception.watch_ids, [self.watch.pk])
+        self.assertEqual(dict(Stock.objects.values_list('watch_id', 'available')), {self.watch.pk: 2, other.pk: 5})
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockConcurrencyTests(TransactionTestCase):
+    def test_concurrent_checkouts_sell_each_unit_once_without_deadlocks(self):
+        watch_ids = []
+        for title in ('First', 'Second'):
+            watch = create_watch(title)
+            Stock.objects.create(watch=watch, available=3)
+            watch_ids.append(watch.pk)
+
+        buyers = 8
+        barrier = threading.Barrier(buyers)
+        outcomes = []
+
+        def buy(index):
+            # Half the carts list the watches in the opposite order.
+            cart = dict.fromkeys(watch_ids if index % 2 else watch_ids[::-1], 1)
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    take_stock(cart)
+                outcomes.append('sold')
+            except OutOfStock:
+                outcomes.append('short')
+            except DatabaseError as error:
+                outcomes.append(repr(error))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(index,)) for index in range(buyers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['short'] * 5 + ['sold'] * 3)
+        self.assertEqual(list(Stock.objects.order_by('watch_id').values_list('available', flat=True)), [0, 0])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class OrderIdempotencyTests(TestCase):
+    def setUp(self):
+        self.watch = create_watch()
+        self.user = User.objects.create_user('buyer', 'buyer@example.com', 'password')
+        self.client.force_login(self.user)
+        self.client.get(f'/add_to_cart/{self.watch.pk}/')
+        self.form = {
+            'idempotency_key': self.client.get('/checkout/').context['idempotency_key'],
+            'address': '1 Street', 'city': 'City', 'postal_code': '1000', 'country': 'Country',
+            'payment_method': 'paypal',
+        }
+
+    def test_repeated_submit_returns_the_same_order(self):
+        first = self.client.post('/place_order/', self.form)
+        with self.assertNumQueries(3):
+            # Session, user and the order lookup; nothing is written.
+            second = self.client.post('/place_order/', self.form)
+        self.assertEqual(first['Location'], second['Location'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_racing_submit_falls_back_to_the_winning_order(self):
+        self.client.post('/place_order/', self.form)
+        order = Order.objects.get()
+        # The second request's first lookup runs before the first commits.
+        with mock.patch('web.orders.find_order', side_effect=[None, order]):
+            self.client.get(f'/add_to_cart/{self.watch.pk}/')
+            response = self.client.post('/place_order/', self.form)
+        self.assertRedirects(response, f'/order_success/{order.pk}/', fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_confirmation_email_rolls_back_with_the_order(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            create_order(
+                self.user, Cart(self.client.session), shipping_address='1 Street', shipping_city='City',
+                shipping_postal_code='1000', shipping_country='Country', email=self.user.email,
+                payment_method='paypal',
+            )
+            self.assertEqual(OutboundEmail.objects.get().recipients, 'buyer@example.com')
+            raise RuntimeError('Worker died before the commit.')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+
+
+class SalesSummaryTests(TestCase):
+    def setUp(self):
+        self.watch = create_watch()
+
+    def place_order(self, quantity):
+        order = Order.objects.create(
+            total_price=100 * quantity, shipping_address='1 Test Street', shipping_city='Test',
+            shipping_postal_code='00000', shipping_country='Test', email='customer@example.com',
+            payment_method='paypal',
+        )
+        OrderItem.objects.create(order=order, product=self.watch, price=100, quantity=quantity)
+        return order
+
+    def test_order_committed_after_the_watermark_is_counted_once(self):
+        first = self.place_order(1)
+        refresh_sales_summary()
+        # Saved before the last run's watermark, but committed after it.
+        late = self.place_order(2)
+        Order.objects.filter(pk=late.pk).update(updated_at=first.updated_at - WATERMARK_LAG / 2)
+
+        refresh_sales_summary()
+        refresh_sales_summary()
+        self.assertEqual(list(DailySales.objects.values_list('orders', 'units')), [(2, 3)])
+
+
+@override_settings(STORAGES=TEST_STORAGES, METRICS_SAMPLE_RATE=1)
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+
+    def test_sampled_request_is_timed_and_exported(self):
+        response = self.client.get('/about/')
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        self.assertEqual(registry.snapshot()['about']['requests'], 1)
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            metrics = self.client.get('/metrics/').content.decode()
+        self.assertIn('web_requests_total{view="about"} 1', metrics)
+
+    def test_metrics_are_not_public(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get('/metrics/').status_code, 200)
+        self.client.force_login(User.objects.create_user('staff', password='password', is_staff=True))
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_recorded(self):
+        response = self.client.get('/about/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(registry.snapshot(), {})
+
+    @override_settings(QUERY_BUDGETS={'about': 1}, QUERY_BUDGET_STRICT=True)
+    def test_strict_query_budget_fails_the_request(self):
+        # Loading the session and the user is already two queries.
+        self.client.force_login(User.objects.create_user('shopper', password='password'))
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/about/')
+
+
+# Most queries each view may run, enforced by MetricsMiddleware. They must
+# hold whatever the size of the catalog or the cart.
+VIEW_QUERY_BUDGETS = {
+    'index': 4,
+    'shop': 4,
+    'cart': 2,
+    'cart_api': 7,
+    'add_to_cart': 6,
+    'update_quantity': 4,
+    'remove_item': 4,
+    'checkout': 6,
+    'place_order': 15,
+}
+# Slowest page allowed on the 100k watch catalog, in seconds. Loose, as it
+# depends on the machine; only the slow test checks it.
+WALL_TIME_BUDGET = float(os.environ.get('TEST_WALL_TIME_BUDGET', '5'))
+
+
+@override_settings(
+    STORAGES=TEST_STORAGES,
+    METRICS_SAMPLE_RATE=1, QUERY_BUDGETS=VIEW_QUERY_BUDGETS, QUERY_BUDGET_STRICT=True,
+)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command('import_catalog', stdout=StringIO())
+        cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password')
+        cls.watch_ids = list(Watch.objects.order_by('watch_id').values_list('watch_id', flat=True)[:MAX_CART_OPERATIONS])
+        cls.brand = Watch.objects.select_related('brand').get(watch_id=cls.watch_ids[0]).brand.brand_name
+
+    def setUp(self):
+        # Every test starts with cold page, lookup and priced cart caches.
+        cache.clear()
+        self.timings = {}
+
+    def measure(self, method, path, data=None, **extra):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, data, **extra)
+            self.timings[f'{method.upper()} {path}'] = time.perf_counter() - started
+        return response, len(queries)
+
+    def shop_paths(self):
+        combinations = product(
+            [None, self.brand],
+            [None, *Gender.objects.values_list('gender_name', flat=True)],
+            [None, *Type.objects.values_list('type_name', flat=True)],
+            [None, *PRICE_RANGES],
+        )
+        for values in combinations:
+            yield '/shop/?' + urlencode({name: value for name, value in zip(FILTER_PARAMS, values, strict=True) if value})
+
+    def catalog_query_counts(self):
+        # Anonymous visitors hit the page cache cold; logged in users are never cached.
+        paths = ['/', *self.shop_paths()]
+        counts = {path: self.measure('get', path)[1] for path in paths}
+        self.client.force_login(self.user)
+        counts.update({f'user {path}': self.measure('get', path)[1] for path in paths})
+        self.client.logout()
+        return counts
+
+    def cart_query_counts(self, lines):
+        watch_ids = self.watch_ids[:lines + 1]
+        self.client.force_login(self.user)
+        counts = {}
+        _, counts['cart_api'] = self.measure(
+            'post', '/api/cart/', json.dumps({'ops': [{'op': 'add', 'watch_id': watch_id} for watch_id in watch_ids]}),
+            content_type='application/json',
+        )
+        _, counts['add_to_cart'] = self.measure('get', f'/add_to_cart/{watch_ids[0]}/')
+        _, counts['cart'] = self.measure('get', '/cart/')
+        _, counts['update_quantity'] = self.measure('get', f'/update_quantity/{watch_ids[0]}/increase/')
+        _, counts['remove_item'] = self.measure('get', f'/remove_item/{watch_ids[-1]}/')
+        response, counts['checkout'] = self.measure('get', '/checkout/')
+        response, counts['place_order'] = self.measure('post', '/place_order/', {
+            'idempotency_key': response.context['idempotency_key'],
+            'address': '1 Street', 'city': 'City', 'postal_code': '1000', 'country': 'Country',
+            'payment_method': 'paypal',
+        })
+        self.assertEqual(Order.objects.get(pk=response.url.split('/')[-2]).order_items.count(), lines)
+        self.client.logout()
+        return counts
+
+    def test_catalog_pages_stay_within_budget(self):
+        self.catalog_query_counts()
+
+    def test_queries_do_not_grow_with_cart_size(self):
+        self.assertEqual(self.cart_query_counts(1), self.cart_query_counts(MAX_CART_OPERATIONS - 1))
+
+    @tag('slow')
+    def test_queries_do_not_grow_with_catalog_size(self):
+        # Run with `manage.py test --exclude-tag slow` to skip the 100k watch load.
+        small = self.catalog_query_counts()
+        with tempfile.TemporaryDirectory() as directory:
+            feed = write_synthetic_watches(
+                Path(settings.BASE_DIR) / 'Csv files' / 'watches.csv', Path(directory) / 'watches.csv', 100_000,
+            )
+            call_command('import_catalog', watches=feed, stdout=StringIO())
+        self.assertEqual(Watch.objects.count(), 100_000)
+        cache.clear()
+        self.timings = {}
+        self.assertEqual(small, self.catalog_query_counts())
+        request, elapsed = max(self.timings.items(), key=lambda item: item[1])
+        self.assertLess(elapsed, WALL_TIME_BUDGET, f'{request} took {elapsed:.3f}s')
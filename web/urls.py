@@ -1,21 +1,38 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, async_views, metrics, views
 
-urlpatterns = [
-    path('', views.index, name='index'),
-    path('about/', views.about, name='about'),
-    path('contact/', views.contact, name='contact'),
-    path('shop/', views.shop_view, name='shop'),
-    path('cart/', views.cart_view, name='cart'),
-    path('add_to_cart/<int:watch_id>/', views.add_to_cart, name='add_to_cart'),
-    path('clear_cart/', views.clear_cart, name='clear_cart'),
-    path('checkout/', views.checkout_view, name='checkout'),
-    path('thank-you/', views.thank_you_view, name='contact_thank_you'),
-    path('login-register/', views.login_register_view, name='login_register'),
-    path('logout/', views.logout_view, name='logout'),
-    path('account/', views.account_view, name='account'),
-    path('place_order/', views.place_order, name='place_order'),
-    path('order_success/<int:order_id>/', views.order_success_view, name='order_success_view'),
-    path('update_quantity/<int:watch_id>/<str:action>/', views.update_quantity, name='update_quantity'),
-    path('remove_item/<int:watch_id>/', views.remove_item, name='remove_item'),
-]
+
+def build_urlpatterns(catalog_views):
+    # The catalog and cart routes come from `catalog_views`, which is the
+    # async_views module for ASGI deployments (ASYNC_VIEWS) and views otherwise.
+    return [
+        path('', catalog_views.index, name='index'),
+        path('about/', views.about, name='about'),
+        path('contact/', views.contact, name='contact'),
+        path('shop/', catalog_views.shop_view, name='shop'),
+        path('search/', catalog_views.shop_view, name='search'),
+        path('search/suggest/', views.search_suggest_view, name='search_suggest'),
+        path('cart/', catalog_views.cart_view, name='cart'),
+        path('api/cart/', catalog_views.cart_api, name='cart_api'),
+        path('add_to_cart/<int:watch_id>/', catalog_views.add_to_cart, name='add_to_cart'),
+        path('clear_cart/', views.clear_cart, name='clear_cart'),
+        path('checkout/', views.checkout_view, name='checkout'),
+        path('thank-you/', views.thank_you_view, name='contact_thank_you'),
+        path('login-register/', views.login_register_view, name='login_register'),
+        path('logout/', views.logout_view, name='logout'),
+        path('account/', views.account_view, name='account'),
+        path('place_order/', views.place_order, name='place_order'),
+        path('order_success/<int:order_id>/', views.order_success_view, name='order_success_view'),
+        path('update_quantity/<int:watch_id>/<str:action>/', catalog_views.update_quantity, name='update_quantity'),
+        path('remove_item/<int:watch_id>/', catalog_views.remove_item, name='remove_item'),
+        path('images/watch/<int:watch_id>/<int:width>/', views.watch_thumbnail, name='watch_thumbnail'),
+        path('api/watches/', api.watch_list_api, name='watch_list_api'),
+        path('api/watches/<int:watch_id>/', api.watch_detail_api, name='watch_detail_api'),
+        path('healthz/', views.healthz, name='healthz'),
+        path('readyz/', views.readyz, name='readyz'),
+        path('metrics/', metrics.metrics_view, name='metrics'),
+    ]
+
+
+urlpatterns = build_urlpatterns(async_views if settings.ASYNC_VIEWS else views)
@@ -1,13 +1,116 @@
-from django.core.mail import send_mail
+from contextlib import suppress
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db import transaction
 from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+EMAIL_RETRY_DELAY = 60
+EMAIL_MAX_RETRY_DELAY = 60 * 60
+# How long a claimed email is hidden from other workers while it is sent.
+EMAIL_CLAIM_TIMEOUT = 10 * 60
+
+
+def queue_email(subject, message, recipient_list, from_email=None):
+    """
+    Store an email in the outbox instead of sending it during the request.
+    The send_queued_email management command delivers it.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=','.join(recipient_list),
+    )
+
+
+def claim_due_emails(batch_size):
+    """
+    Claim a batch of due emails in a short transaction. The attempt is
+    counted and next_attempt_at is moved EMAIL_CLAIM_TIMEOUT ahead, so other
+    workers skip the rows once the locks are released, and a worker that dies
+    mid-batch only delays them.
+    """
+    with transaction.atomic():
+        # Rows locked by another worker are skipped, so several workers can
+        # drain the outbox without sending an email twice.
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        claimed_until = timezone.now() + timedelta(seconds=EMAIL_CLAIM_TIMEOUT)
+        for email in emails:
+            email.attempts += 1
+            email.next_attempt_at = claimed_until
+        OutboundEmail.objects.bulk_update(emails, ['attempts', 'next_attempt_at'])
+    return emails
+
+
+def record_failure(email, error, max_attempts):
+    email.last_error = str(error)
+    if email.attempts >= max_attempts:
+        email.status = 'failed'
+    else:
+        delay = min(EMAIL_RETRY_DELAY * 2 ** (email.attempts - 1), EMAIL_MAX_RETRY_DELAY)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+
+
+def send_queued_emails(batch_size=100, max_attempts=5):
+    """
+    Send one batch of due emails over a single backend connection, opened
+    outside any database transaction. Failed emails, including a batch whose
+    connection could not be opened, are retried with exponential backoff
+    until max_attempts is reached. Returns the number of emails sent and
+    failed.
+    """
+    emails = claim_due_emails(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    # SMTP and socket errors are OSErrors; a malformed header is a ValueError.
+    try:
+        connection.open()
+    except (OSError, ValueError) as exc:
+        for email in emails:
+            record_failure(email, exc, max_attempts)
+        failed = len(emails)
+    else:
+        try:
+            for email in emails:
+                message = EmailMessage(
+                    email.subject,
+                    email.body,
+                    email.from_email,
+                    email.get_recipient_list(),
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    record_failure(email, exc, max_attempts)
+                else:
+                    sent += 1
+                    email.status = 'sent'
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+        finally:
+            # The batch is already sent; a failed QUIT changes nothing.
+            with suppress(OSError):
+                connection.close()
+
+    OutboundEmail.objects.bulk_update(emails, ['status', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
+
 
 def send_order_confirmation(order):
     subject = f"Order Confirmation - #{order.id}"
     message = render_to_string('order_confirmation_email.html', {'order': order})
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [order.email],
-    )
+    queue_email(subject, message, [order.email])
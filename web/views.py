@@ -1,33 +1,72 @@
+import hashlib
+import json
+import time
+
 from django.db import connection
-from django.db.utils import OperationalError
-from django.http import HttpResponse
+from django.db.utils import DatabaseError
+from django.http import FileResponse, HttpResponse, JsonResponse, Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from .models import Watch, Brand, Gender, Type, Order, OrderItem
+from django.utils.cache import patch_cache_control
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import require_http_methods
+from .models import Watch, Order
+from .images import THUMBNAIL_CONTENT_TYPE, ImageFetchError, build_thumbnails, source_version, thumbnail_path, thumbnails_exist
+from .cart import Cart, CartError, added_watch_ids, check_added_watches, parse_operations
+from .catalog import FILTER_PARAMS, get_filters, get_ordering, filter_watches, get_facets, get_featured_watches, get_lookups
+from .orders import get_or_create_order, new_idempotency_key
+from .stock import STOCK_TAG, OutOfStock, in_stock, reserve
+from .page_cache import CATALOG_TAGS, cache_anonymous_page
+from .pagination import ApproximateCountPaginator, KeysetPaginator
+from .search import search_watches
 from .forms import ContactForm, LoginForm, RegisterForm
 
 
+SHOP_PARAMS = (*FILTER_PARAMS, 'in_stock', 'q', 'sort', 'page', 'cursor')
+SHOP_TAGS = (*CATALOG_TAGS, STOCK_TAG)
+
+
+DB_STATUS_TTL = 5
+_db_status = {'checked_at': None, 'ok': False}
+
+
 def check_db_connection():
-    try:
-        connection.ensure_connection()
-        return True
-    except OperationalError:
-        return False
+    # The result is reused for DB_STATUS_TTL seconds, so frequent readiness
+    # probes do not each open a connection and run a query.
+    now = time.monotonic()
+    if _db_status['checked_at'] is None or now - _db_status['checked_at'] > DB_STATUS_TTL:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            _db_status['ok'] = True
+        except DatabaseError:
+            _db_status['ok'] = False
+        _db_status['checked_at'] = now
+    return _db_status['ok']
+
+
+def healthz(request):
+    # Liveness: the process is serving requests. Never touches the database.
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    if check_db_connection():
+        return JsonResponse({'status': 'ok', 'database': 'ok'})
+    return JsonResponse({'status': 'unavailable', 'database': 'unreachable'}, status=503)
 
 
+@cache_anonymous_page(tags=CATALOG_TAGS)
 def index(request):
-    if check_db_connection():
-        watches = Watch.objects.all()[:12]
-        return render(request, 'index.html', {'watches': watches})
-    else:
-        return HttpResponse("Database connection failed. Please check your database settings.")
+    return render(request, 'index.html', {'watches': get_featured_watches()})
 
 
+@cache_anonymous_page()
 def about(request):
     return render(request, 'about.html')
 
@@ -80,57 +119,100 @@ def login_register_view(request):
         'register_form': register_form,
     })
 
+@cache_anonymous_page(tags=SHOP_TAGS, params=SHOP_PARAMS)
 def shop_view(request):
-    brands = Brand.objects.all()
-    genders = Gender.objects.all()
-    types = Type.objects.all()
-
-    selected_brand = request.GET.get('brand', None)
-    selected_gender = request.GET.get('gender', None)
-    selected_price_range = request.GET.get('price_range', None)
-    selected_type = request.GET.get('type', None)
-
-    watches = Watch.objects.all()
-
-    if selected_brand:
-        watches = watches.filter(brand__brand_name=selected_brand)
-
-    if selected_gender:
-        watches = watches.filter(gender__gender_name=selected_gender)
-
-    if selected_price_range:
-        price_ranges = {
-            "0-50": (0, 50),
-            "51-100": (51, 100),
-            "101-200": (101, 200),
-            "201-500": (201, 500),
-            "500+": (500, None)
-        }
-        min_price, max_price = price_ranges.get(selected_price_range, (None, None))
-        if min_price is not None:
-            watches = watches.filter(price__gte=min_price)
-        if max_price is not None:
-            watches = watches.filter(price__lte=max_price)
-
-    if selected_type:
-        watches = watches.filter(type__type_name=selected_type)
-
-    paginator = Paginator(watches, 9)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
-    context = {
+    filters = get_filters(request.GET)
+    ordering = get_ordering(request.GET)
+    search_query = request.GET.get('q', '').strip()
+    watches = filter_watches(filters, Watch.objects.select_related('image'))
+    if request.GET.get('in_stock'):
+        watches = in_stock(watches)
+    keyset_pagination = settings.SHOP_PAGINATION == 'keyset' and not search_query
+
+    if search_query:
+        # Search results are ordered by relevance, which cursors cannot seek on.
+        paginator = Paginator(search_watches(watches, search_query), 9)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    elif keyset_pagination:
+        paginator = KeysetPaginator(watches, 9, ordering, approximate_count=settings.SHOP_APPROXIMATE_COUNT)
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator_class = ApproximateCountPaginator if settings.SHOP_APPROXIMATE_COUNT else Paginator
+        paginator = paginator_class(watches.order_by(*ordering), 9)
+        page_obj = paginator.get_page(request.GET.get('page'))
+
+    get_lookups().attach(page_obj)
+    return render(request, 'shop.html', shop_context(request, filters, search_query, page_obj, keyset_pagination))
+
+
+def shop_context(request, filters, search_query, page_obj, keyset_pagination):
+    return {
         'watches': page_obj,
-        'brands': brands,
-        'genders': genders,
-        'types': types,
-        'selected_brand': selected_brand,
-        'selected_gender': selected_gender,
-        'selected_price_range': selected_price_range,
-        'selected_type': selected_type,
+        'keyset_pagination': keyset_pagination,
+        'approximate_count': settings.SHOP_APPROXIMATE_COUNT,
+        # Lazy, so a cached filter sidebar skips computing the facets.
+        'facets': SimpleLazyObject(lambda: get_facets(filters)),
+        # Facet counts cover the filters only, so they are hidden for searches
+        # and the in-stock filter.
+        'show_facet_counts': not search_query and not request.GET.get('in_stock'),
+        'search_query': search_query,
+        'selected_brand': filters['brand'],
+        'selected_gender': filters['gender'],
+        'selected_price_range': filters['price_range'],
+        'selected_type': filters['type'],
+        'selected_sort': request.GET.get('sort', ''),
+        'selected_in_stock': bool(request.GET.get('in_stock')),
     }
 
-    return render(request, 'shop.html', context)
+
+def search_suggest_view(request):
+    query = request.GET.get('q', '').strip()
+    suggestions = []
+    if query:
+        suggestions = list(search_watches(Watch.objects.all(), query).values('watch_id', 'title')[:8])
+    return JsonResponse({'suggestions': suggestions})
+
+
+def original_image(watch):
+    response = redirect(watch.image_url)
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
+
+def watch_thumbnail(request, watch_id, width):
+    # Thumbnails are pre-built by the build_thumbnails command and served from
+    # disk; one missed by it is built here on first request. A failed fetch is
+    # remembered for THUMBNAIL_RETRY_AFTER seconds and only one request builds
+    # at a time, so an unreachable source is not fetched on every request.
+    # Until then, and on failure, the original image is served instead. With
+    # a matching ?v= the URL is unique to the source image, so it is cached
+    # for a year.
+    if width not in settings.THUMBNAIL_WIDTHS:
+        raise Http404("Unknown thumbnail size.")
+    watch = get_object_or_404(Watch.objects.select_related('image').only(
+        'watch_id', 'image_url', 'image__source_url', 'image__content_hash',
+    ), watch_id=watch_id)
+
+    record = getattr(watch, 'image', None)
+    if record is None or record.source_url != watch.image_url or not thumbnails_exist(record):
+        # Keyed on the URL too, so a new image_url is tried straight away.
+        key = f'thumbnail:build:{watch.watch_id}:{hashlib.md5(watch.image_url.encode()).hexdigest()}'
+        if not cache.add(key, True, settings.THUMBNAIL_RETRY_AFTER):
+            return original_image(watch)
+        try:
+            record = build_thumbnails(watch)
+        except ImageFetchError:
+            return original_image(watch)
+        cache.delete(key)
+
+    # FileResponse closes the file once the body has been sent.
+    thumbnail = open(thumbnail_path(record.content_hash, width), 'rb')  # noqa: SIM115
+    response = FileResponse(thumbnail, content_type=THUMBNAIL_CONTENT_TYPE)
+    if request.GET.get('v') == source_version(record):
+        patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=60 * 60)
+    return response
 
 
 @login_required(login_url='login_register')
@@ -140,42 +222,43 @@ def add_to_cart(request, watch_id):
     except Watch.DoesNotExist:
         return HttpResponse("Watch not found.", status=404)
 
-    if 'cart' not in request.session:
-        request.session['cart'] = {}
-
-    cart = request.session['cart']
-
-    if str(watch.watch_id) in cart:
-        cart[str(watch.watch_id)]['quantity'] += 1
-    else:
-        cart[str(watch.watch_id)] = {
-            'watch_id': watch.watch_id,
-            'name': watch.title,
-            'price': float(watch.price),
-            'image_url': watch.image_url,
-            'quantity': 1,
-        }
-
-    request.session.modified = True
+    Cart(request.session).add(watch.watch_id)
     messages.success(request, f"{watch.title} has been added to your cart.")
     return redirect('shop')
 
 def cart_view(request):
-    cart = request.session.get('cart', {})
-    total_price = sum(float(item['price']) * item['quantity'] for item in cart.values())
-    return render(request, 'cart.html', {'cart': cart, 'total_price': total_price})
+    cart = Cart(request.session)
+    return render(request, 'cart.html', {'cart': cart.lines, 'total_price': cart.total})
+
+
+@require_http_methods(['GET', 'POST'])
+def cart_api(request):
+    # GET returns the priced cart. POST applies {"op": ...} or {"ops": [...]}
+    # (add, set, remove, clear) and returns the repriced cart.
+    cart = Cart(request.session)
+    if request.method == 'POST':
+        try:
+            operations = parse_operations(json.loads(request.body))
+            existing_ids = Watch.objects.filter(watch_id__in=added_watch_ids(operations)).values_list('watch_id', flat=True)
+            check_added_watches(operations, request.user.is_authenticated, existing_ids)
+            cart.apply(operations)
+        except CartError as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+        except ValueError:
+            return JsonResponse({'error': 'Request body must be JSON.'}, status=400)
+    return JsonResponse(cart.serialize())
 
 def clear_cart(request):
-    request.session['cart'] = {}
+    Cart(request.session).clear()
     return redirect('cart')
 
 def checkout_view(request):
-    cart = request.session.get('cart', {})
-    if not cart:
+    cart = Cart(request.session)
+    # A repeated POST arrives after the cart was cleared, so it must still
+    # reach get_or_create_order to find its order.
+    if not cart and request.method != 'POST':
         return redirect('shop')
 
-    total_price = sum(item['price'] * item['quantity'] for item in cart.values())
-
     if request.method == 'POST':
         shipping_address = request.POST.get('shipping_address')
         shipping_city = request.POST.get('shipping_city')
@@ -184,55 +267,46 @@ def checkout_view(request):
         email = request.POST.get('email')
 
         if request.user.is_authenticated:
-            order = Order.objects.create(
-                user=request.user,
-                total_price=total_price,
-                shipping_address=shipping_address,
-                shipping_city=shipping_city,
-                shipping_postal_code=shipping_postal_code,
-                shipping_country=shipping_country,
-                email=email
-            )
-
-            for watch_id, item in cart.items():
-                watch = Watch.objects.get(watch_id=watch_id)
-                OrderItem.objects.create(
-                    order=order,
-                    product=watch,
-                    price=item['price'],
-                    quantity=item['quantity']
+            try:
+                order, created = get_or_create_order(
+                    request.user,
+                    cart,
+                    idempotency_key=request.POST.get('idempotency_key'),
+                    reservation_key=request.session.session_key,
+                    shipping_address=shipping_address,
+                    shipping_city=shipping_city,
+                    shipping_postal_code=shipping_postal_code,
+                    shipping_country=shipping_country,
+                    email=email
                 )
+            except OutOfStock as error:
+                messages.error(request, str(error))
+                return redirect('cart')
 
-            send_confirmation_email(order)
-            del request.session['cart']
+            if order is None:
+                return redirect('shop')
+            if created:
+                cart.clear()
 
             return redirect('order_success_view', order_id=order.id)
         else:
             return HttpResponse("You must be logged in to place an order.", status=401)
 
-    return render(request, 'checkout.html', {'cart': cart, 'total_price': total_price})
-
-
-def send_confirmation_email(order):
-    subject = f"Order Confirmation - Order #{order.id}"
-    message = f"Thank you for your order!\n\nOrder Summary:\n\n"
-    message += f"Order ID: {order.id}\n"
-    message += f"Shipping Address: {order.shipping_address}\n"
-    message += f"Total Price: ${order.total_price}\n\n"
-    message += "Items in your order:\n"
-
-    for item in order.get_order_items():
-        message += f"- {item.product.title} (x{item.quantity}) - ${item.price * item.quantity}\n"
-
-    message += "\nThank you for shopping with us!"
+    # Hold the units while the customer fills in the checkout form.
+    if request.session.session_key is None:
+        request.session.save()
+    try:
+        reserve(request.session.session_key, {int(watch_id): quantity for watch_id, quantity in cart.items.items()})
+    except OutOfStock as error:
+        messages.error(request, str(error))
+        return redirect('cart')
+
+    return render(request, 'checkout.html', {
+        'cart': cart.lines,
+        'total_price': cart.total,
+        'idempotency_key': new_idempotency_key(),
+    })
 
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [order.user.email],
-        fail_silently=False,
-    )
 
 def account_view(request):
     return render(request, 'account.html', {'user': request.user})
@@ -259,37 +333,32 @@ def place_order(request):
         if not shipping_address:
             return HttpResponse("Shipping address is required.", status=400)
 
-        cart = request.session.get('cart', {})
-        total_price = sum(
-            float(item['price']) * int(item['quantity'])
-            for item in cart.values()
-        )
+        cart = Cart(request.session)
 
         if request.user.is_authenticated:
             user = request.user
 
-            order = Order.objects.create(
-                user=user,
-                total_price=total_price,
-                shipping_address=shipping_address,
-                shipping_city=shipping_city,
-                shipping_postal_code=shipping_postal_code,
-                shipping_country=shipping_country,
-                payment_method=payment_method,
-                email=user.email
-            )
-
-            for watch_id, item in cart.items():
-                watch = Watch.objects.get(watch_id=watch_id)
-                OrderItem.objects.create(
-                    order=order,
-                    product=watch,
-                    price=item['price'],
-                    quantity=item['quantity']
+            try:
+                order, created = get_or_create_order(
+                    user,
+                    cart,
+                    idempotency_key=request.POST.get('idempotency_key'),
+                    reservation_key=request.session.session_key,
+                    shipping_address=shipping_address,
+                    shipping_city=shipping_city,
+                    shipping_postal_code=shipping_postal_code,
+                    shipping_country=shipping_country,
+                    payment_method=payment_method,
+                    email=user.email
                 )
+            except OutOfStock as error:
+                messages.error(request, str(error))
+                return redirect('cart')
 
-            send_confirmation_email(order)
-            del request.session['cart']
+            if order is None:
+                return redirect('shop')
+            if created:
+                cart.clear()
 
             return redirect('order_success_view', order_id=order.id)
         else:
@@ -299,39 +368,24 @@ def place_order(request):
 
 
 def update_quantity(request, watch_id, action):
-    cart = request.session.get('cart', {})
-
-    try:
-        watch = Watch.objects.get(watch_id=watch_id)
-    except Watch.DoesNotExist:
-        return HttpResponse('Product not found', status=404)
+    cart = Cart(request.session)
 
-    item = cart.get(str(watch.watch_id), None)
-    if not item:
+    if watch_id not in cart:
         return HttpResponse('Item not in cart', status=404)
 
+    quantity = cart.items[str(watch_id)]
     if action == 'increase':
-        item['quantity'] += 1
+        cart.set(watch_id, quantity + 1)
     elif action == 'decrease':
-        if item['quantity'] > 1:
-            item['quantity'] -= 1
-        else:
-            del cart[str(watch.watch_id)] 
-    
-    if item['quantity'] == 0:
-        del cart[str(watch.watch_id)]  
-    
-    request.session['cart'] = cart
+        cart.set(watch_id, quantity - 1)
 
     return redirect('cart')
 
 def remove_item(request, watch_id):
-    cart = request.session.get('cart', {})
+    cart = Cart(request.session)
 
-    if str(watch_id) in cart:
-        del cart[str(watch_id)]
-        request.session['cart'] = cart
-        request.session.modified = True
+    if watch_id in cart:
+        cart.remove(watch_id)
         messages.success(request, "Item removed from the cart.")
     else:
         messages.error(request, "Item not found in the cart.")
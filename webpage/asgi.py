@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webpage.settings')
 
 application = get_asgi_application()
+
+from web.apps import warm_templates  # noqa: E402
+
+warm_templates()
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'web.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,7 +67,13 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'webpage.urls'
 
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Session storage. The default keeps sessions in the database. cached_db and
+# cache need SESSION_CACHE_URL to point at a cache shared by every worker,
+# e.g. rediscache://127.0.0.1:6379/2, or filecache:///var/tmp/watchhouse-sessions
+# on a single host; a per-process local-memory cache would lose cart updates.
+# Compare the backends with `python manage.py bench_sessions`.
+SESSION_ENGINE = env('SESSION_ENGINE', default='django.contrib.sessions.backends.db')
+SESSION_CACHE_ALIAS = 'sessions'
 
 
 SESSION_COOKIE_NAME = 'sessionid'
@@ -76,15 +83,24 @@ SESSION_COOKIE_SECURE = True
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'web.metrics.InstrumentedDjangoTemplates',
+        # The alias would otherwise default to 'metrics', after the module.
+        'NAME': 'django',
         'DIRS': [os.path.join(BASE_DIR, 'template')],  # Corrected path to templates
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'web.context_processors.catalog',
+            ],
+            # Compiled templates are kept in memory for the life of the worker.
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
             ],
         },
     },
@@ -96,6 +112,11 @@ STORAGES = {
     },
 }
 
+# Compile every template under template/ when a server worker loads
+# webpage/wsgi.py or asgi.py, so the first request it serves does not pay
+# for it. Management commands never load them and skip the warm-up.
+TEMPLATE_WARMUP = env.bool('TEMPLATE_WARMUP', default=not DEBUG)
+
 WSGI_APPLICATION = 'webpage.wsgi.application'
 
 
@@ -110,9 +131,29 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        # Keep connections open between requests instead of reconnecting on
+        # every request; health checks drop connections that went stale.
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Optional psycopg 3 connection pool, sized per worker process. The pool
+# replaces persistent connections, so CONN_MAX_AGE must be 0 with it.
+if env.bool('DB_POOL', default=False):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10),
+        },
+    }
+
+# Large exports iterate with server-side cursors (QuerySet.iterator). Turn
+# them off when connecting through pgbouncer in transaction pooling mode.
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = env.bool('DB_DISABLE_SERVER_SIDE_CURSORS', default=False)
+
 # import pymysql
 # pymysql.install_as_MySQLdb()
 
@@ -136,6 +177,45 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Cache for catalog lookups, facet counts and the catalog version key. With
+# several gunicorn workers point CACHE_URL at a shared backend (for example
+# rediscache://127.0.0.1:6379/1) so every worker sees catalog changes.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+    'sessions': env.cache('SESSION_CACHE_URL', default='locmemcache://sessions'),
+}
+
+# Lifetime of cached anonymous pages (web/page_cache.py). Catalog changes
+# expire them earlier through tag invalidation.
+PAGE_CACHE_TIMEOUT = env.int('PAGE_CACHE_TIMEOUT', default=600)
+
+# Shop listing pagination: 'offset' (numbered pages) or 'keyset' (cursor links
+# that stay fast on deep pages). SHOP_APPROXIMATE_COUNT uses the PostgreSQL
+# planner estimate instead of COUNT(*) for the total.
+SHOP_PAGINATION = env('SHOP_PAGINATION', default='offset')
+SHOP_APPROXIMATE_COUNT = env.bool('SHOP_APPROXIMATE_COUNT', default=False)
+
+# Serve the catalog and cart pages from web/async_views.py. Only useful under
+# an ASGI server, e.g. `gunicorn webpage.asgi:application -k uvicorn.workers.UvicornWorker`.
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
+# How long checkout holds stock for a cart before release_reservations
+# returns it (web/stock.py), and the most units held per cart line.
+STOCK_RESERVATION_TIMEOUT = env.int('STOCK_RESERVATION_TIMEOUT', default=15 * 60)
+STOCK_RESERVATION_MAX_QUANTITY = env.int('STOCK_RESERVATION_MAX_QUANTITY', default=5)
+
+# Fraction of requests timed by web/metrics.py (0 turns it off). Sampled
+# responses carry a Server-Timing header and feed the /metrics/ endpoint,
+# which only answers staff users, METRICS_ALLOWED_IPS and requests with
+# "Authorization: Bearer <METRICS_TOKEN>".
+# QUERY_BUDGETS maps URL names to the most queries a request may run; going
+# over logs a warning, or raises QueryBudgetExceeded if QUERY_BUDGET_STRICT.
+METRICS_SAMPLE_RATE = env.float('METRICS_SAMPLE_RATE', default=0.0)
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=[])
+QUERY_BUDGETS = {}
+QUERY_BUDGET_STRICT = env.bool('QUERY_BUDGET_STRICT', default=False)
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'your-email@example.com'
 
@@ -157,6 +237,17 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Watch thumbnails (web/images.py) are written under MEDIA_ROOT/thumbs with
+# content-hashed names. Only the listed URL schemes are fetched; tests add
+# 'file' to read local stand-in images.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = env('MEDIA_ROOT', default=os.path.join(BASE_DIR, 'media'))
+THUMBNAIL_WIDTHS = [160, 320, 480]
+IMAGE_FETCH_SCHEMES = ['https', 'http']
+IMAGE_FETCH_TIMEOUT = env.int('IMAGE_FETCH_TIMEOUT', default=10)
+# Seconds before the thumbnail view tries a source that failed to fetch again.
+THUMBNAIL_RETRY_AFTER = env.int('THUMBNAIL_RETRY_AFTER', default=600)
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 